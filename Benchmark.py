@@ -0,0 +1,253 @@
+import argparse
+import json
+import os
+import pickle
+import platform
+import sys
+import time
+import tracemalloc
+import cv2
+import numpy as np
+import PegGrid
+import VisualizeJsonData
+from DataLoader import ClusterPointsToIntersections, DataLoader, remove_duplicate_points
+from PieceDetector import PieceDetector
+
+# Times the Hot Paths on the Recorded project_used_data Boards (Pickled Trials, lines.pkl, board.jpg) Plus
+# Synthetic Frames of a Chip Dropped Down the Board. Results Saved as JSON Baselines to Catch Regressions.
+
+precisions = ['30mm', '31mm', '33mm', 'Open']
+
+# Purpose: Load Every Precision's Trials / Chains / Lines / Board Image Up Front (Not Timed)
+# Output: Dict Like {'30mm': {'folder': ..., 'trials': [...], 'chains': [...], 'lines': [...], 'board_image': ...}, ...}
+def load_assets(data_dir = "project_used_data"):
+    assets = {}
+    for mm in precisions:
+        folder = os.path.join(data_dir, mm)
+        with open(os.path.join(folder, "cached_data", "lines.pkl"), 'rb') as f:
+            lines = pickle.load(f)
+        assets[mm] = {
+            'folder': folder,
+            'trials': [np.asarray(trial) for trial in DataLoader(os.path.join(folder, "piece_trials"))],
+            'chains': list(VisualizeJsonData.load_json(os.path.join(folder, "final_runs.json")).values()),
+            'lines_location': os.path.join(folder, "cached_data", "lines.pkl"),
+            'lines': lines,
+            'board_image': os.path.join(folder, "cached_data", "board.jpg"),
+        }
+    return assets
+
+# Purpose: Board Photo Desaturated (Snapshots Can Hold a Resting Chip) so a Rendered Chip is the Only One
+def load_empty_board(board_image):
+    board = cv2.imread(board_image)
+    if board is None:
+        raise Exception(f"Could not Load {board_image}")
+    hsv = cv2.cvtColor(board, cv2.COLOR_BGR2HSV)
+    hsv[:, :, 1] = np.minimum(hsv[:, :, 1], PieceDetector().saturation_cutoff // 2)
+    return cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)
+
+# Purpose: Empty Board Frames With a Chip (Saturated Disc) Drawn Along a Recorded Trial
+# Input: Board Image Location, Trial Like [(x, y), ...], Frames Wanted, Chip Radius
+# Output: List of BGR Frames
+def render_chip_frames(board_image, trial, frame_count = 300, chip_radius = 12):
+    board = load_empty_board(board_image)
+    frames = []
+    for index in np.linspace(0, len(trial) - 1, frame_count).astype(int):
+        frame = board.copy()
+        cv2.circle(frame, (int(trial[index][0]), int(trial[index][1])), chip_radius, (30, 60, 230), -1)
+        frames.append(frame)
+    return frames
+
+# Purpose: Time a Call (Best of repeat), Then Measure Peak Python/NumPy Memory of One Extra Call
+#          (tracemalloc Doesn't See OpenCV's Own Allocations)
+# Input: Function, Items Processed per Call, Unit Name, Repeats
+# Output: Dict Like {'seconds': ..., '{unit}_per_sec': ..., 'items': ..., 'peak_memory_bytes': ...}
+def measure(function, items, unit, repeat = 5):
+    # Warm Up (Caches, Lazy Allocations)
+    function()
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        seconds.append(time.perf_counter() - start)
+    tracemalloc.start()
+    function()
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    best = min(seconds)
+    return {'seconds': best, f'{unit}_per_sec': items / best, 'items': items, 'peak_memory_bytes': peak_memory}
+
+# Purpose: Per Frame Detection as BoardViewer Runs It (Tracking and Full Search Every Frame, Each Detection Mode)
+def bench_detection(assets, frame_count = 300, repeat = 5):
+    results = {}
+    board = assets['30mm']
+    frames = render_chip_frames(board['board_image'], board['trials'][0], frame_count)
+    empty_board = load_empty_board(board['board_image'])
+    height, width = frames[0].shape[:2]
+    for name, tracking_mode, detection_mode, pyramid_scale in (
+            ('detect_tracking', True, PieceDetector.SATURATION, 1),
+            ('detect_full_search', False, PieceDetector.SATURATION, 1),
+            ('detect_pyramid2_full_search', False, PieceDetector.SATURATION, 2),
+            ('detect_pyramid4_full_search', False, PieceDetector.SATURATION, 4),
+            ('detect_background_tracking', True, PieceDetector.BACKGROUND, 1),
+            ('detect_background_full_search', False, PieceDetector.BACKGROUND, 1)):
+        def detect_all():
+            detector = PieceDetector(tracking_mode=tracking_mode, detection_mode=detection_mode,
+                                     pyramid_scale=pyramid_scale)
+            detector.set_background(empty_board)
+            for frame in frames:
+                detector.detect(frame, roi=(0, 0, width, height))
+        results[name] = measure(detect_all, len(frames), 'frames', repeat)
+    return results
+
+# Purpose: Tracker Accuracy When the Chip Lands Past the Search Window (Must Match Full Search, Not a Clipped Blob)
+# Input: Assets, Jumps Past the Prediction (px), Chip Radius
+# Output: Dict Like {mode: worst px Between Tracked and Full Search Centers, ...}
+def check_tracking_jumps(assets, jumps = range(40, 100, 5), chip_radius = 18):
+    board = load_empty_board(assets['30mm']['board_image'])
+    height, width = board.shape[:2]
+    def chip_frame(center):
+        frame = board.copy()
+        cv2.circle(frame, (int(center[0]), int(center[1])), chip_radius, (30, 60, 230), -1)
+        return frame
+    start, velocity = np.array([width * 0.4, height * 0.3]), np.array([8.0, 10.0])
+    worst = {}
+    for detection_mode in (PieceDetector.SATURATION, PieceDetector.BACKGROUND):
+        worst[detection_mode] = 0.0
+        for jump in jumps:
+            for direction in ((1, 0), (0, 1), (-1, 0), (1, 1)):
+                tracked = PieceDetector(tracking_mode=True, detection_mode=detection_mode)
+                searched = PieceDetector(tracking_mode=False, detection_mode=detection_mode)
+                tracked.set_background(board)
+                searched.set_background(board)
+                # Steady Motion, Then One Frame Far Past the Prediction
+                for step in range(4):
+                    tracked.detect(chip_frame(start + step * velocity))
+                frame = chip_frame(start + 4 * velocity + jump * np.array(direction) / np.hypot(*direction))
+                tracked_center, _ = tracked.detect(frame)
+                searched_center, _ = searched.detect(frame)
+                if tracked_center is None or searched_center is None:
+                    error = np.inf
+                else:
+                    error = float(np.hypot(tracked_center[0] - searched_center[0], tracked_center[1] - searched_center[1]))
+                worst[detection_mode] = max(worst[detection_mode], error)
+    return worst
+
+# Purpose: Peg Grid From Every lines.pkl
+def bench_intersections(assets, repeat = 5):
+    def build_all():
+        for board in assets.values():
+            PegGrid.get_intersection_points_from_lines(board['lines'], ClusterPointsToIntersections.vh_threshold)
+    return {'get_intersection_points_from_lines': measure(build_all, len(assets), 'grids', repeat)}
+
+# Purpose: Snap + Chain Every Trial (Peg Grid Built Once per Board, Like Batch Reprocessing)
+def bench_cluster(assets, repeat = 5):
+    def cluster_all():
+        for board in assets.values():
+            peg_grid = ClusterPointsToIntersections.load_peg_grid(board['lines_location'])
+            for trial in board['trials']:
+                ClusterPointsToIntersections(trial, board['lines_location'], peg_grid=peg_grid, verbose=False)
+    trial_count = sum(len(board['trials']) for board in assets.values())
+    return {'cluster_points_to_intersections': measure(cluster_all, trial_count, 'trials', repeat)}
+
+# Purpose: Dedupe Every Raw Trial
+def bench_remove_duplicates(assets, repeat = 5):
+    trials = [trial for board in assets.values() for trial in board['trials']]
+    def dedupe_all():
+        for trial in trials:
+            remove_duplicate_points(trial)
+    return {'remove_duplicate_points': measure(dedupe_all, len(trials), 'trials', repeat)}
+
+# Purpose: VisualizeJsonData Summaries per Precision (Uncached)
+def bench_analyses(assets, repeat = 5):
+    chain_count = sum(len(board['chains']) for board in assets.values())
+    def end_distribution_all():
+        for board in assets.values():
+            VisualizeJsonData.get_end_distribution(VisualizeJsonData.get_ending_x_coordinates(board['chains']))
+    def variations_all():
+        for board in assets.values():
+            VisualizeJsonData.get_variations_vs_depth(board['chains'])
+    def entropy_all():
+        for board in assets.values():
+            VisualizeJsonData.get_branching_entropy(board['chains'])
+    def average_path_all():
+        for board in assets.values():
+            VisualizeJsonData.get_average_path_image(board['chains'], board['board_image'])
+    return {
+        'end_distribution': measure(end_distribution_all, chain_count, 'trials', repeat),
+        'variations_vs_depth': measure(variations_all, chain_count, 'trials', repeat),
+        'branching_entropy': measure(entropy_all, chain_count, 'trials', repeat),
+        'average_path_image': measure(average_path_all, chain_count, 'trials', repeat),
+    }
+
+# Purpose: Run Every Benchmark
+# Output: Dict Like {'environment': {...}, 'benchmarks': {name: result, ...}}
+def run_benchmarks(data_dir = "project_used_data", frame_count = 300, repeat = 5):
+    assets = load_assets(data_dir)
+    benchmarks = {}
+    benchmarks.update(bench_detection(assets, frame_count, repeat))
+    benchmarks.update(bench_intersections(assets, repeat))
+    benchmarks.update(bench_cluster(assets, repeat))
+    benchmarks.update(bench_remove_duplicates(assets, repeat))
+    benchmarks.update(bench_analyses(assets, repeat))
+    environment = {
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+    return {'environment': environment, 'benchmarks': benchmarks, 'checks': {'tracking_jump_error_px': check_tracking_jumps(assets)}}
+
+# Purpose: Benchmarks Slower Than Baseline by More Than tolerance (0.2 = 20% Slower)
+# Output: List Like [(name, baseline seconds, current seconds), ...]
+def find_regressions(results, baseline, tolerance = 0.2):
+    regressions = []
+    for name, result in results['benchmarks'].items():
+        if name not in baseline['benchmarks']:
+            continue
+        baseline_seconds = baseline['benchmarks'][name]['seconds']
+        if result['seconds'] > baseline_seconds * (1 + tolerance):
+            regressions.append((name, baseline_seconds, result['seconds']))
+    return regressions
+
+
+# Prints a Table, Optionally Saves a Baseline / Compares Against One (Exit Code 1 on Regression)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark detection, peg snapping and analysis hot paths")
+    parser.add_argument("--data-dir", default="project_used_data", help="Folder of recorded precisions")
+    parser.add_argument("--frames", type=int, default=300, help="Synthetic frames for detection")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per benchmark (best kept)")
+    parser.add_argument("--save", metavar="JSON", help="Save results as a baseline")
+    parser.add_argument("--compare", metavar="JSON", help="Baseline to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown before a regression (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.data_dir, args.frames, args.repeat)
+    for name, result in results['benchmarks'].items():
+        rate_key = next(key for key in result if key.endswith('_per_sec'))
+        print(f"{name:34s} {result[rate_key]:12.1f} {rate_key:16s} {result['seconds'] * 1000:10.2f} ms "
+              f"{result['peak_memory_bytes'] / 2**20:8.2f} MiB peak")
+
+    # Tracking Must Agree With Full Search (Exit Code 1 Otherwise)
+    tracking_errors = results['checks']['tracking_jump_error_px']
+    for detection_mode, error in tracking_errors.items():
+        print(f"Tracking Jump Error ({detection_mode}): {error:.1f} px")
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline Saved to {args.save}")
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline, args.tolerance)
+        for name, baseline_seconds, seconds in regressions:
+            print(f"Regression: {name} {baseline_seconds * 1000:.2f} ms -> {seconds * 1000:.2f} ms")
+        if len(regressions) > 0:
+            sys.exit(1)
+        print("No Regressions")
+
+    if max(tracking_errors.values()) > 1.0:
+        print("Tracked Centers Disagree With Full Search")
+        sys.exit(1)
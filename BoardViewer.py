@@ -1,37 +1,92 @@
-import pickle
 from WebCamFeed import WebCamFeed
 import cv2
 import threading
+import time
+import os
+import numpy as np
 from datetime import datetime
-from DataLoader import visualize_last_run
+from TrialFinalizer import TrialFinalizer
+import PegGrid
+from PieceDetector import PieceDetector
+from DataLoader import next_piece_num
+from StageTimer import StageTimer, export_timers
+from TrajectoryBuffer import TrajectoryBuffer
+from StaticOverlay import StaticOverlay
+from DisplayService import DisplayService
 
 # Analyzes Webcam Feed. Draws Contours. Updates Member Variable: self.board_representation based on Web Cam Feed
 class BoardViewer:
 
     # Purpose: Initializes Individual Webcam Feed. Hold/Update Board Representation. Start Analyze Board Thread.
-    def __init__(self, frame_width=1000, frame_height=1000):
+    # Input: device_index / data_dir / board_name Pick the Camera and Files of This Board (Defaults = Single Board),
+    #        show_stats = Draw Stage Latencies on the Frame, stats_log = .csv / .json Written Every stats_log_interval Seconds,
+    #        detection_mode = PieceDetector.SATURATION or PieceDetector.BACKGROUND (Difference From cached_data/background.jpg,
+    #                         Captured With ('b') While the Board is Empty),
+    #        pyramid_scale = Full Searches Run at 1/2 or 1/4 Size Then Refined at Full Size (1 = Off),
+    #        display_fps = Window Repaints per Second, Detection Runs at Camera Rate Regardless (None = Headless, No Window),
+    #        display = DisplayService Shared by Several Boards (None = This Board Starts its Own at display_fps),
+    #        poll_keyboard = Read Keys Directly (False = Keys Dispatched to self.webcam_feed.handle_key by a Runner),
+    #        detection_slots = Semaphore Shared by Several Boards Bounding How Many Detect at Once (None = Unbounded)
+    def __init__(self, frame_width=1000, frame_height=1000, tracking_mode=True, data_folder=None,
+                 device_index=0, data_dir="", board_name=None, start_piece_num=None,
+                 show_stats=True, stats_log=None, stats_log_interval=5.0, detection_mode=PieceDetector.SATURATION,
+                 pyramid_scale=1, display_fps=30.0, display=None, poll_keyboard=True, detection_slots=None):
         # WebCamFeed for each BoardViewer
-        self.webcam_feed = WebCamFeed(frame_width, frame_height)
+        self.webcam_feed = WebCamFeed(frame_width, frame_height, data_folder=data_folder,
+                                      device_index=device_index, data_dir=data_dir, board_name=board_name,
+                                      poll_keyboard=poll_keyboard)
+        self.board_name = board_name
 
         '''
             Holds Current Piece Location Information    
         '''
-        # Array Like [(x1, y1), (x2, y2), ...]
-        self.current_piece_location_over_time = []
-        self.current_piece_num = 91 # Update This for Starting Save Index
+        # Rows of (Frame Seq, Capture Time, x, y, Area, Detected) for the Trial in Progress
+        self.trajectory_buffer = TrajectoryBuffer()
+        # Where Trials are Saved (piece{n}.pkl Folder, or a TrajectoryStore Folder to Append to)
+        self.data_folder = self.webcam_feed.data_folder
+        # Starting Save Index (None = After the Last Saved Trial)
+        self.current_piece_num = start_piece_num if start_piece_num is not None else next_piece_num(self.data_folder)
+        # Saves / Chains / Renders Finished Trials in the Background
+        self.trial_finalizer = TrialFinalizer(self.data_folder, self.webcam_feed.lines_location,
+                                              os.path.join(self.webcam_feed.cached_data_folder, "board.jpg"),
+                                              self.webcam_feed.snapshot_service)
+        self.preview_title = "Plotted Route" if board_name is None else f"Plotted Route - {board_name}"
 
-        # Minimum Area Considered as Piece
-        self.contour_area_cutoff_min = 200
-        # Maximum Area Considered as Piece
-        self.contour_area_cutoff_max = 100000
-        # Saturation Minimum
-        self.saturation_cutoff = 120
-        # Value Minimum (For Shadows)
-        self.value_cutoff = 140
+        # Finds Piece in Each Frame (Thresholds, Tracker)
+        self.detector = PieceDetector(tracking_mode=tracking_mode, detection_mode=detection_mode,
+                                      background_location=self.webcam_feed.background_location,
+                                      pyramid_scale=pyramid_scale)
+        self.detection_slots = detection_slots
+        if detection_mode == PieceDetector.BACKGROUND and not os.path.exists(self.webcam_feed.background_location):
+            print("No Empty Board Reference Yet. Using the First Frame Until ('b') is Pressed With the Board Empty")
+        # Last Empty Board Reference Handed to the Detector
+        self.background_version = 0
+        # Throughput Stats
+        self.frames_analyzed = 0
+        self.detection_seconds = 0.0
+        self.stats_start_time = time.perf_counter()
+        # Per Stage Timings of the Analyze Loop (Detector Charges hsv / threshold / contours to the Same Timer)
+        self.stage_timer = StageTimer()
+        self.detector.stage_timer = self.stage_timer
+        self.show_stats = show_stats
+        self.stats_log = stats_log
+        self.stats_log_interval = stats_log_interval
+        self.stats_log_time = time.perf_counter()
         # Vertical Horizontal Threshold Distance
         self.vh_threshold = 300
-        # Frame Delay
-        self.frame_delay = 1
+        # Cached Intersection Points (Pegs) and the Lines Version They Were Built From
+        self.intersection_points = []
+        self.intersection_lines_version = -1
+        # Lines + Pegs Drawn Once per Lines Version, Composited Onto Every Frame
+        self.static_overlay = StaticOverlay()
+        # Shows Annotated Frames on the GUI Thread at display_fps (Plus the Last Finished Trial's Route)
+        self.owns_display = display is None and display_fps is not None
+        if self.owns_display:
+            display = DisplayService(display_fps)
+        self.display = None
+        if display is not None:
+            self.display = display.add_window(self.webcam_feed.frame_title, self.setup_window,
+                                              (self.preview_title, self.trial_finalizer.get_preview))
         # Thread which takes info from the webcam feed and constantly updates contour and board information
         self.analyze_thread = threading.Thread(target=self.analyze_board).start()
 
@@ -39,174 +94,181 @@ class BoardViewer:
         All For Sliders
     '''
     def saturation_cutoff_change(self, val):
-        self.saturation_cutoff = val
+        self.detector.saturation_cutoff = val
 
     def value_cutoff_change(self, val):
-        self.value_cutoff = val
+        self.detector.value_cutoff = val
 
     def contour_area_cutoff_min_change(self, val):
-        self.contour_area_cutoff_min = val
+        self.detector.contour_area_cutoff_min = val
 
     def contour_area_cutoff_max_change(self, val):
-        self.contour_area_cutoff_max = val
+        self.detector.contour_area_cutoff_max = val
+
+    def diff_cutoff_change(self, val):
+        self.detector.diff_cutoff = val
     
     '''
         Main Loop
     '''
-    # Purpose: Main Update Loop. Takes Recent frame from self.webcam_feed and acts on it.
+    # Purpose: Main Update Loop. Takes Every Captured Frame from self.webcam_feed, Finds the Piece and Records it.
+    #          Frames are Only Annotated When the Display Wants One (Never When Headless)
     def analyze_board(self):
-        # Used for Initialization of Sliders
-        is_first_show = True
+        # Reused Frame Buffer (Copied Out of the Pipeline Each Frame, Swapped With the Display's Spare)
+        image = None
+        stage_timer = self.stage_timer
         while self.webcam_feed.is_running:
-            # If the current frame isn't empty (on initialization)
-            if self.webcam_feed.current_frame.all() is not None:
+            stage_timer.begin_frame()
+            # Sleep Until the Next Captured Frame (Each Frame Processed Exactly Once)
+            frame_seq, capture_ns, frame = self.webcam_feed.frame_pipeline.get(out=image, timeout=0.5)
+            # If a Frame Arrived (None on Timeout / Feed Closed)
+            if frame is not None:
                 # Grab current frame from WebCamFeed
-                image = self.webcam_feed.current_frame
+                image = frame
+                stage_timer.lap('wait')
 
-                '''
-                    Saturation Method (All Bright Colored Chips)
-                '''
-                # Convert to HSV (Hue, Saturation, Value) -> Value
-                hue, saturation, value = cv2.split(cv2.cvtColor(image, cv2.COLOR_BGR2HSV))
-                #Threshold Saturation
-                _, saturation = cv2.threshold(saturation, self.saturation_cutoff, 255, cv2.THRESH_BINARY)
-                # Set Saturation Greyscale to 0 where value is less than value cutoff
-                # Get pixels lower than threshold (value)
-                _, value = cv2.threshold(value, self.value_cutoff, 255, cv2.THRESH_BINARY)
-                # Mask Saturation with Value
-                saturation = cv2.bitwise_and(saturation, saturation, mask=value)
+                # New Empty Board Reference Captured
+                if self.background_version != self.webcam_feed.background_version:
+                    self.background_version = self.webcam_feed.background_version
+                    self.detector.set_background(self.webcam_feed.background_frame)
 
-                '''
-                    Draw Circle Around Piece
-                '''
-                # Find Contours
-                (contours, hierarchy) = cv2.findContours(saturation.copy(), cv2.RETR_TREE,
-                                                         cv2.CHAIN_APPROX_SIMPLE)
-                # Filter Contours By Area
-                contours, hierarchy = self.filter_contours_by_area(contours, hierarchy)
-                # Do Contour Things
-                if len(contours) > 0:
-                    # Get Center of Contour
-                    x_center, y_center = self.get_center_of_contour(contour=contours[0])
-                    # Put Text Above Piece
-                    cv2.putText(image, "Piece :)", (x_center-25, y_center-25), cv2.FONT_HERSHEY_SIMPLEX, fontScale=0.5, color=(0, 0, 255), thickness=2)
-                    # Draw Circle Around Piece
-                    cv2.circle(image, (x_center, y_center), radius=15, color = (0, 0, 255), thickness=3)
+                # Find Contours Filtered By Area (Only Inside Crop Region When WebCamFeed is in ROI Mode)
+                roi = self.webcam_feed.roi
+                detection_start = time.perf_counter()
+                if self.detection_slots is not None:
+                    with self.detection_slots:
+                        center, contours = self.detector.detect(image, roi=roi)
+                else:
+                    center, contours = self.detector.detect(image, roi=roi)
+                self.detection_seconds += time.perf_counter() - detection_start
+                self.frames_analyzed += 1
+                # Rest of Detection (Area Filter, Tracker, Centroid)
+                stage_timer.lap('filter')
+                stage_timer.record('capture_to_detection', (time.monotonic_ns() - capture_ns) / 1e9)
 
                 # Check if is Timing /do Appropriate Actions
                 if self.webcam_feed.is_timing:
-                    # Put Timing Text
-                    image = cv2.putText(image.copy(), str((datetime.now()-self.webcam_feed.start_time).total_seconds())[:5], (40, 40), cv2.FONT_HERSHEY_SIMPLEX, fontScale=1, color=(0, 255, 0), thickness=2)
-                    self.current_piece_location_over_time.append((x_center, y_center))
+                    # Every Frame Gets a Row (Missed Frames Flagged, Never Given a Stale Position)
+                    if center is not None:
+                        self.trajectory_buffer.append(frame_seq, capture_ns, center[0], center[1],
+                                                      cv2.contourArea(contours[0]), True)
+                    else:
+                        self.trajectory_buffer.append(frame_seq, capture_ns, detected=False)
                 else: # Timer Turned Off
                     # If Still Items This is First Call Turned Off
-                    if len(self.current_piece_location_over_time) > 0:
-                        # Save
-                        with open(f'piece_trials/piece{self.current_piece_num}.pkl', 'wb') as f:
-                            pickle.dump(self.current_piece_location_over_time, f)
-                        # Empty Array
-                        self.current_piece_location_over_time = []
-                        self.current_piece_num += 1
-                        
-                        # See Chained Points
-                        visualize_last_run()
+                    if len(self.trajectory_buffer) > 0:
+                        if self.trajectory_buffer.detected_count > 0:
+                            # Save / See Chained Points (Queued, Rows Handed Over Without Copying)
+                            self.trial_finalizer.submit(self.trajectory_buffer.detach(), self.current_piece_num,
+                                                        self.webcam_feed.trial_snapshot_ticket)
+                            self.current_piece_num += 1
+                        else:
+                            print("Piece Never Detected During Trial. Not Saved")
+                            self.trajectory_buffer.clear()
+                stage_timer.lap('record')
 
-                # Combine Images To Track Piece
-                # mask = saturation
-                # image[mask==255] = (36, 12, 255)
+                # Annotate and Hand Over Frame Only as Often as the Window Repaints
+                if self.display is not None and self.display.wants_frame():
+                    self.annotate_frame(image, center, roi)
+                    stage_timer.lap('draw')
+                    # Display Keeps This Frame, Gives Back One it's Done With (or None -> Pipeline Allocates)
+                    image = self.display.show(image)
+                    stage_timer.lap('handoff')
+                stage_timer.count('frames')
+                stage_timer.set_counter('dropped_frames', self.webcam_feed.frame_pipeline.dropped_frames)
+                stage_timer.end_frame()
+                # Write Stats Log Every stats_log_interval Seconds
+                if self.stats_log is not None and time.perf_counter() - self.stats_log_time >= self.stats_log_interval:
+                    self.stats_log_time = time.perf_counter()
+                    self.export_stats(self.stats_log)
+        if self.owns_display:
+            self.display.display.stop()
+        elif self.display is not None:
+            self.display.close()
+        # Finish Any Queued Trials Before Exiting
+        self.trial_finalizer.close()
+        if self.stats_log is not None:
+            self.export_stats(self.stats_log)
 
-                '''
-                    Draw Intersection Points (Kinda Slow)
-                '''
-                # Get Intersection Points
-                intersection_points = self.get_intersection_points_from_lines(lines=self.webcam_feed.lines_coords)
-                # Draw Intersection Points
-                image = self.draw_points(image, intersection_points)
+    # Purpose: Draw Piece, Trial Timer, Pegs / Lines, Crop Region and Stats Onto Frame (In Place)
+    def annotate_frame(self, image, center, roi):
+        if center is not None:
+            x_center, y_center = center
+            # Put Text Above Piece
+            cv2.putText(image, "Piece :)", (x_center-25, y_center-25), cv2.FONT_HERSHEY_SIMPLEX, fontScale=0.5, color=(0, 0, 255), thickness=2)
+            # Draw Circle Around Piece
+            cv2.circle(image, (x_center, y_center), radius=15, color = (0, 0, 255), thickness=3)
+        if self.webcam_feed.is_timing:
+            # Put Timing Text
+            cv2.putText(image, str((datetime.now()-self.webcam_feed.start_time).total_seconds())[:5], (40, 40), cv2.FONT_HERSHEY_SIMPLEX, fontScale=1, color=(0, 255, 0), thickness=2)
+        # Get Intersection Points (Only Recomputed When Lines Change)
+        if self.intersection_lines_version != self.webcam_feed.lines_version:
+            self.intersection_lines_version = self.webcam_feed.lines_version
+            self.intersection_points = self.get_intersection_points_from_lines(lines=self.webcam_feed.lines_coords)
+        # Draw Intersection Points and Lines (Rendered Into the Cached Layer Only When Lines / Frame Size Change)
+        overlay_key = (self.intersection_lines_version, image.shape)
+        if self.static_overlay.is_stale(overlay_key):
+            layer = np.zeros_like(image)
+            self.draw_points(layer, self.intersection_points)
+            self.draw_lines(layer)
+            self.static_overlay.update(layer, overlay_key)
+        self.static_overlay.composite(image)
+        # Outline Crop Region (ROI Mode Doesn't Black Out the Rest of the Frame)
+        if roi is not None:
+            (x0, y0, x1, y1) = roi
+            cv2.rectangle(image, (x0, y0), (x1 - 1, y1 - 1), color=(255, 255, 255), thickness=1)
+        # Stage Latencies (This Loop + Capture and Display Loops)
+        if self.show_stats:
+            self.stage_timer.draw_overlay(image, {'capture': self.webcam_feed.stage_timer, 'display': self.display.stage_timer})
+        return image
 
-                # Draw Lines
-                image = self.draw_lines(image)
-                # Show the image
-                cv2.imshow(self.webcam_feed.frame_title, image)
-                # If First Run, Add Sliders
-                if is_first_show:
-                    # Saturation
-                    cv2.createTrackbar('Saturation Cutoff', self.webcam_feed.frame_title, self.saturation_cutoff, 255,
-                                       self.contour_area_cutoff_min_change)
-                    # Value
-                    cv2.createTrackbar('Value Cutoff', self.webcam_feed.frame_title, self.value_cutoff, 255,
-                                       self.contour_area_cutoff_min_change)
-                    # Min Area Slider
-                    cv2.createTrackbar('Min Area', self.webcam_feed.frame_title, self.contour_area_cutoff_min, 400,
-                                       self.contour_area_cutoff_min_change)
-                    # Max Area Slider
-                    cv2.createTrackbar('Max Area', self.webcam_feed.frame_title, self.contour_area_cutoff_max, 400,
-                                       self.contour_area_cutoff_max_change)
-                    is_first_show = False
-                # Wait in between frames
-                cv2.waitKey(self.frame_delay)
+    # Purpose: Add Sliders and Crop / Line Mouse Callback (Runs on the GUI Thread Once the Window is Up)
+    def setup_window(self):
+        self.create_trackbars()
+        self.webcam_feed.prompt_crop()
 
-    # Get Intersection Points of Lines
-    def get_intersection_points_from_lines(self, lines):
+    # Purpose: Add Sliders
+    def create_trackbars(self):
+        # Saturation
+        cv2.createTrackbar('Saturation Cutoff', self.webcam_feed.frame_title, self.detector.saturation_cutoff, 255,
+                           self.contour_area_cutoff_min_change)
+        # Value
+        cv2.createTrackbar('Value Cutoff', self.webcam_feed.frame_title, self.detector.value_cutoff, 255,
+                           self.contour_area_cutoff_min_change)
+        # Min Area Slider
+        cv2.createTrackbar('Min Area', self.webcam_feed.frame_title, self.detector.contour_area_cutoff_min, 400,
+                           self.contour_area_cutoff_min_change)
+        # Max Area Slider
+        cv2.createTrackbar('Max Area', self.webcam_feed.frame_title, self.detector.contour_area_cutoff_max, 400,
+                           self.contour_area_cutoff_max_change)
+        # Background Difference
+        if self.detector.detection_mode == PieceDetector.BACKGROUND:
+            cv2.createTrackbar('Diff Cutoff', self.webcam_feed.frame_title, self.detector.diff_cutoff, 255 * 3,
+                               self.diff_cutoff_change)
 
-        # Took From Online
-        def line(p1, p2):
-            A = (p1[1] - p2[1])
-            B = (p2[0] - p1[0])
-            C = (p1[0]*p2[1] - p2[0]*p1[1])
-            return A, B, -C
+    # Purpose: Throughput Since Start
+    # Output: Dict Like {'frames': n, 'fps': x, 'detection_ms': x, 'dropped_frames': n, 'trials_queued': n, 'displayed_frames': n}
+    def get_throughput_stats(self):
+        elapsed = time.perf_counter() - self.stats_start_time
+        return {
+            'frames': self.frames_analyzed,
+            'fps': self.frames_analyzed / elapsed if elapsed > 0 else 0.0,
+            'detection_ms': 1000 * self.detection_seconds / max(self.frames_analyzed, 1),
+            'dropped_frames': self.webcam_feed.frame_pipeline.dropped_frames,
+            'trials_queued': len(self.trial_finalizer),
+            'displayed_frames': self.display.shown_frames if self.display is not None else 0,
+        }
 
-        # Took From Online
-        def find_intersection(L1, L2):
-            D  = L1[0] * L2[1] - L1[1] * L2[0]
-            Dx = L1[2] * L2[1] - L1[1] * L2[2]
-            Dy = L1[0] * L2[2] - L1[2] * L2[0]
-            if D != 0:
-                x = Dx / D
-                y = Dy / D
-                return x,y
-            else:
-                return False
+    # Purpose: Write Analyze, Capture and Display Stage Latencies to a .csv (Appended) or .json Log
+    def export_stats(self, location):
+        timers = {'analyze': self.stage_timer, 'capture': self.webcam_feed.stage_timer}
+        if self.display is not None:
+            timers['display'] = self.display.stage_timer
+        export_timers(location, timers)
 
-        intersection_points = [] # Like [(x1, y1), ...]
-
-        # Sort Lines by Horizontal and Vertical
-        vertical_lines = []
-        horizontal_lines = []
-        # Get Y Coordinates of Horizontal Lines / X Coordinates of Vertical Lines
-        for line_coords in lines:
-            # Lines Coords
-            x1, y1 = line_coords[0]
-            x2, y2 = line_coords[1]
-            # Color Depends on Orientation
-            if abs(y1-y2) > self.vh_threshold: # Vertical Lines
-                vertical_lines.append(line_coords)
-            elif abs(x1-x2) > self.vh_threshold: # Horizontal Lines
-                horizontal_lines.append(line_coords)
-
-        # Get Y Coordinates of Horizontal Lines / X Coordinates of Vertical Lines
-        for horizontal in horizontal_lines:
-            for vertical in vertical_lines:
-                # Get Lines
-                L1 = line(horizontal[0], horizontal[1])
-                L2 = line(vertical[0], vertical[1])
-                # Find Intersection Point
-                intersection = find_intersection(L1, L2)
-                # Check if there is intesection point and not already added
-                if intersection is not False and intersection not in intersection_points:
-                    # Check if is within bounds
-                    x1 = horizontal[0][0]; y1 = horizontal[0][1]
-                    x2 = horizontal[1][0]; y2 = horizontal[1][1]
-
-                    x3 = vertical[0][0]; y3 = vertical[0][1]
-                    x4 = vertical[1][0]; y4 = vertical[1][1]
-
-                    x = round(intersection[0])
-                    y = round(intersection[1])
-
-                    if (x1 < x < x2 or x2 < x < x1) and (y3 < y < y4 or y4 < y < y3):
-                        intersection_points.append((x, y))
-                    
-        return intersection_points
+    # Get Intersection Points of Lines (Shared Batched Peg Grid Builder)
+    def get_intersection_points_from_lines(self, lines):
+        return PegGrid.get_intersection_points_from_lines(lines, self.vh_threshold)
 
     # Draw Points
     def draw_points(self, image, points, color = (0, 0, 255)):
@@ -214,9 +276,8 @@ class BoardViewer:
             image = cv2.circle(image, point, radius=2, color = color, thickness=2)
         return image
 
-    # Draws Lines
+    # Draws Lines (In Place)
     def draw_lines(self, image):
-        image = image.copy()
         for line_coords in self.webcam_feed.lines_coords:
             # Lines Coords
             x1, y1 = line_coords[0]
@@ -228,36 +289,5 @@ class BoardViewer:
                 cv2.line(image, line_coords[0], line_coords[1], color = (255, 36, 12), thickness=1)
         return image
 
-    # Purpose: Filter Contours by Area (Closed Mandatory)
-    # Input: Contour List, Hierarchy List
-    # Output: Contours Filtered by Area, Corresponding Hierarchy
-    def filter_contours_by_area(self, contours, hierarchy):
-        # New Empty Lists for Contours and Hierarchy
-        new_contours = []
-        new_hierarchy = [[]]
-        # Iterate through Contours
-        for i in range(len(contours)):
-            # If Contour Area (closed) is greater than value 1 and less than value 2, it is a piece
-            if (cv2.contourArea(contours[i]) > self.contour_area_cutoff_min) and \
-                    (cv2.contourArea(contours[i]) < self.contour_area_cutoff_max):
-                # Append the Piece Contours to the new_contours and new_hierarchy lists
-                new_contours.append(contours[i])
-                new_hierarchy[0].append(hierarchy[0][i])
-        # Return Contour and Hierarchy Lists
-        return new_contours, new_hierarchy
-
-
-    # Purpose: Finds Centroid using Pixel Values
-    # Input: Contour
-    # Output: Centroid Coordinates of Contour
-    def get_center_of_contour(self, contour):
-        # cv2.moments read data
-        m = cv2.moments(contour)
-        # Get X Coordinate, Get Y Coordinate
-        contour_center_x = int(m["m10"] / m["m00"])
-        contour_center_y = int(m["m01"] / m["m00"])
-        # return the centroid x and y coordinates
-        return contour_center_x, contour_center_y
-
 if __name__ == "__main__":
     BoardViewer()
\ No newline at end of file
@@ -3,24 +3,25 @@ import os
 import glob
 import numpy as np
 import cv2
-import math
 import json
 import re
-
+import argparse
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import PegGrid
+from TrajectoryStore import TrajectoryStore
+from TrajectoryBuffer import is_samples, detected_points
+
+# Purpose: Remove Repeated Points, Keeping the Order They First Appear In
+# Input: Points Like [(x1, y1), ...] or Array (N, 2)
+# Output: Array of Unique Points
 def remove_duplicate_points(points):
-    new_points = []
-    for point in points:
-        if len(new_points) == 0:
-            new_points.append(point)
-            continue
-        found_match = False
-        for new_point in new_points:
-            if np.array_equal(point, new_point):
-                found_match = True
-                break
-        if not found_match:
-            new_points.append(point)
-    return np.array(new_points)
+    points = np.asarray(points)
+    if len(points) == 0:
+        return points
+    # Sort-Based Unique, Then Put Back in First Occurrence Order
+    _, first_index = np.unique(points.reshape(len(points), -1), axis=0, return_index=True)
+    return points[np.sort(first_index)]
 
 def atoi(text):
     return int(text) if text.isdigit() else text
@@ -33,32 +34,151 @@ def natural_keys(text):
     '''
     return [atoi(c) for c in re.split(r'(\d+)', text)]
 
+# Purpose: Save Single Trial Like [(x1, y1), ...] as piece{n}.pkl (Appended Instead if Folder is a TrajectoryStore).
+#          TrajectoryBuffer Samples Save Their Detected Points the Same Way (Same [(x1, y1), ...] Pickle as Always),
+#          Every Row Only Goes in piece{n}.samples.npy
+# Output: Location Saved To
+def save_trial(trial, piece_num, data_folder = "piece_trials"):
+    os.makedirs(data_folder, exist_ok=True)
+    # Samples Written First (Trial Only Counts Once its Points Exist)
+    if is_samples(trial):
+        np.save(samples_location(data_folder, piece_num), trial)
+        trial = [(x, y) for x, y in detected_points(trial).tolist()]
+    if TrajectoryStore.is_store(data_folder):
+        TrajectoryStore(data_folder).append(trial, piece_num)
+        return data_folder
+    location = os.path.join(data_folder, f"piece{piece_num}.pkl")
+    with open(location, 'wb') as f:
+        pickle.dump(trial, f)
+    DataLoader.invalidate_listing(data_folder)
+    return location
+
+# Purpose: Where a Trial's Timestamped Samples are Kept
+def samples_location(data_folder, piece_num):
+    return os.path.join(data_folder, f"piece{piece_num}.samples.npy")
+
+# Purpose: Timestamped Samples of a Trial (TrajectoryBuffer Rows), None if Saved Without Them
+def load_trial_samples(piece_num, data_folder = "piece_trials"):
+    location = samples_location(data_folder, piece_num)
+    return np.load(location) if os.path.exists(location) else None
+
+# Purpose: Piece Number After the Highest Saved Trial (0 if None)
+def next_piece_num(data_folder = "piece_trials"):
+    if TrajectoryStore.is_store(data_folder):
+        piece_nums = TrajectoryStore(data_folder).piece_nums.tolist()
+        return max(piece_nums, default=-1) + 1
+    piece_nums = [int(re.findall(r'\d+', os.path.basename(location))[-1])
+                  for location in glob.glob(data_folder + "/piece*.pkl")]
+    return max(piece_nums, default=-1) + 1
+
+# Purpose: Delete Most Recent Trial (Highest piece{n}.pkl, or Last Trial in a TrajectoryStore)
+def delete_last_trial(data_folder = "piece_trials"):
+    if TrajectoryStore.is_store(data_folder):
+        store = TrajectoryStore(data_folder)
+        if len(store) == 0:
+            return
+        piece_num = int(store.piece_nums[-1])
+        store.pop()
+    else:
+        trial_locations = DataLoader.list_trials(data_folder)
+        if len(trial_locations) == 0:
+            return
+        os.remove(trial_locations[-1])
+        DataLoader.invalidate_listing(data_folder)
+        piece_num = int(re.findall(r'\d+', os.path.basename(trial_locations[-1]))[-1])
+    if os.path.exists(samples_location(data_folder, piece_num)):
+        os.remove(samples_location(data_folder, piece_num))
+
+# Purpose: Trials Folder Inside a Data Folder (trial_store/ if Imported, Else piece_trials/)
+def trials_folder(folder):
+    store_folder = os.path.join(folder, "trial_store")
+    return store_folder if TrajectoryStore.is_store(store_folder) else os.path.join(folder, "piece_trials")
+
+# Trials Loaded on Demand by Index (Newest Trial is data_loader[-1])
 class DataLoader:
 
+    # Sorted Trial Listings Like {folder: ((folder modified time, entry count), [location, ...])}
+    listing_cache = {}
+    # Decoded Trials, Least Recently Used First Like {(location, modified time): trial}
+    trial_cache = OrderedDict()
+    trial_cache_size = 256
+
     def __init__(self, data_folder = "piece_trials"):
-        # Load Image Locations
-        piece_trials_locations = glob.glob(data_folder + "/*")
-        # Sort Properly
-        piece_trials_locations.sort(key=natural_keys)
-        # Load Piece Trials
-        self.trials_loaded = self.load_trials(piece_trials_locations)
+        self.data_folder = data_folder
+        # Columnar Store -> Trials Read Lazily as Zero-Copy Slices
+        self.store = TrajectoryStore(data_folder) if TrajectoryStore.is_store(data_folder) else None
+        # Sorted Trial Locations (Listing Cached, Only Re-Scanned When Folder Changes)
+        self.piece_trials_locations = self.list_trials(data_folder) if self.store is None else None
+
+    # Old Name for the Trials (Now Loaded on Demand)
+    @property
+    def trials_loaded(self):
+        return self
 
     def __len__(self):
-        return len(self.trials_loaded)
+        return len(self.store) if self.store is not None else len(self.piece_trials_locations)
+
+    # Loads Trial(s) by Index
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if self.store is not None:
+            return self.store[index]
+        return self.load_array(self.piece_trials_locations[index])
 
-    # Loads Single Trial
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    # Loads Single Trial (Decoded Trials Kept in LRU Cache Until File Changes)
     def load_array(self, location):
         if location is None:
             raise Exception("No Location Loaded")
+        key = (location, os.stat(location).st_mtime_ns)
+        if key in self.trial_cache:
+            self.trial_cache.move_to_end(key)
+            return self.trial_cache[key]
         with open(location, "rb") as f:
-            return pickle.load(f)
-
-    # Loads All trialls
-    def load_trials(self, piece_trials_locations):
-        trials_loaded = []
-        for trial in piece_trials_locations:
-            trials_loaded.append(self.load_array(trial))
-        return trials_loaded
+            trial = pickle.load(f)
+        self.trial_cache[key] = trial
+        if len(self.trial_cache) > self.trial_cache_size:
+            self.trial_cache.popitem(last=False)
+        return trial
+
+    # Purpose: Sorted Trial Locations, Merging Only What Changed Since the Last Listing
+    #          (Entry Count Catches Files Added Within One Modified Time Tick / on Coarse Timestamp Filesystems)
+    @classmethod
+    def list_trials(cls, data_folder):
+        folder_state = None
+        if os.path.isdir(data_folder):
+            folder_state = (os.stat(data_folder).st_mtime_ns, len(os.listdir(data_folder)))
+        cached = cls.listing_cache.get(data_folder)
+        if cached is not None and cached[0] is not None and cached[0] == folder_state:
+            return cached[1]
+        current = set(glob.glob(data_folder + "/*.pkl"))
+        if cached is None:
+            piece_trials_locations = sorted(current, key=natural_keys)
+        else:
+            # Keep Existing Order, Drop Removed, Add New
+            piece_trials_locations = [location for location in cached[1] if location in current]
+            for location in sorted(current.difference(cached[1]), key=natural_keys):
+                piece_trials_locations = cls.insert_sorted(piece_trials_locations, location)
+        cls.listing_cache[data_folder] = (folder_state, piece_trials_locations)
+        return piece_trials_locations
+
+    # Purpose: Force the Next Listing to Re-Scan (Merged Into the Cached Order) After a Trial is Saved / Deleted
+    @classmethod
+    def invalidate_listing(cls, data_folder):
+        cached = cls.listing_cache.get(data_folder)
+        if cached is not None:
+            cls.listing_cache[data_folder] = (None, cached[1])
+
+    # Purpose: New List With Location in Natural Order (New Trials Almost Always Go Last)
+    @staticmethod
+    def insert_sorted(locations, location):
+        if len(locations) == 0 or natural_keys(location) >= natural_keys(locations[-1]):
+            return locations + [location]
+        return sorted(locations + [location], key=natural_keys)
 
 
 class ClusterPointsToIntersections:
@@ -69,104 +189,57 @@ class ClusterPointsToIntersections:
     # Vertical Horizontal Threshold Distance
     vh_threshold = 300
 
-    def __init__(self, points, lines_location = "cached_data/lines.pkl"):
+    # Peg Grids Built So Far Like {(lines_location, modified_time): (lines, intersection_points, peg_index)}
+    peg_grid_cache = {}
+
+    def __init__(self, points, lines_location = "cached_data/lines.pkl", peg_grid = None, verbose = True):
         # Lines Location
         self.lines_location = lines_location
         # Points
         self.points = np.array(points)
-        # Load Lines
-        with open(self.lines_location, 'rb') as f:
-            self.loaded_lines = pickle.load(f)
-        # Get Intersection Points
-        self.intersection_points = self.get_intersection_points_from_lines(self.loaded_lines)
+        # Load Lines, Intersection Points and Peg Index (Built Once per lines.pkl, or Handed In Prebuilt)
+        if peg_grid is None:
+            peg_grid = self.load_peg_grid(self.lines_location)
+        self.loaded_lines, self.intersection_points, self.peg_index = peg_grid
         # Cluster Points to Intersection Points
-        self.clustered_points = self.cluster(self.points, self.intersection_points)
+        self.clustered_points = self.cluster(self.points, self.peg_index)
         # Chain Points a Max Distance Away
         self.chained_points = self.chain_points(self.clustered_points)
-        print(f"Chained Points Shape: {self.chained_points.shape}")
+        if verbose:
+            print(f"Chained Points Shape: {self.chained_points.shape}")
 
     # Chains Points A Max Distance Away
     def chain_points(self, points):
-        chained_points = []
-        for point1, point2 in zip(points, points[1:]):
-            if math.sqrt((point1[0]-point2[0])**2 + (point1[1]-point2[1])**2) < self.max_line_length:
-                chained_points.append(point1)
-                chained_points.append(point2)
-        return remove_duplicate_points(chained_points)
-
-    def cluster(self, points, intersection_points):
-        def closest_node(node, nodes):
-            dist_2 = np.sum((nodes - node)**2, axis=1)
-            return nodes[np.argmin(dist_2)]
-
-        clustered_points = []
-        for point in points:
-            clustered_points.append(closest_node(point, intersection_points))
-        return remove_duplicate_points(clustered_points)
-
-
-    # Get Intersection Points of Lines
-    def get_intersection_points_from_lines(self, lines):
-
-        # Took From Online
-        def line(p1, p2):
-            A = (p1[1] - p2[1])
-            B = (p2[0] - p1[0])
-            C = (p1[0]*p2[1] - p2[0]*p1[1])
-            return A, B, -C
-
-        # Took From Online
-        def find_intersection(L1, L2):
-            D  = L1[0] * L2[1] - L1[1] * L2[0]
-            Dx = L1[2] * L2[1] - L1[1] * L2[2]
-            Dy = L1[0] * L2[2] - L1[2] * L2[0]
-            if D != 0:
-                x = Dx / D
-                y = Dy / D
-                return x,y
-            else:
-                return False
-
-        intersection_points = [] # Like [(x1, y1), ...]
-
-        # Sort Lines by Horizontal and Vertical
-        vertical_lines = []
-        horizontal_lines = []
-        # Get Y Coordinates of Horizontal Lines / X Coordinates of Vertical Lines
-        for line_coords in lines:
-            # Lines Coords
-            x1, y1 = line_coords[0]
-            x2, y2 = line_coords[1]
-            # Color Depends on Orientation
-            if abs(y1-y2) > self.vh_threshold: # Vertical Lines
-                vertical_lines.append(line_coords)
-            elif abs(x1-x2) > self.vh_threshold: # Horizontal Lines
-                horizontal_lines.append(line_coords)
-
-        # Get Y Coordinates of Horizontal Lines / X Coordinates of Vertical Lines
-        for horizontal in horizontal_lines:
-            for vertical in vertical_lines:
-                # Get Lines
-                L1 = line(horizontal[0], horizontal[1])
-                L2 = line(vertical[0], vertical[1])
-                # Find Intersection Point
-                intersection = find_intersection(L1, L2)
-                # Check if there is intesection point and not already added
-                if intersection is not False and intersection not in intersection_points:
-                    # Check if is within bounds
-                    x1 = horizontal[0][0]; y1 = horizontal[0][1]
-                    x2 = horizontal[1][0]; y2 = horizontal[1][1]
-
-                    x3 = vertical[0][0]; y3 = vertical[0][1]
-                    x4 = vertical[1][0]; y4 = vertical[1][1]
-
-                    x = round(intersection[0])
-                    y = round(intersection[1])
-
-                    if (x1 < x < x2 or x2 < x < x1) and (y3 < y < y4 or y4 < y < y3):
-                        intersection_points.append((x, y))
-                    
-        return intersection_points
+        points = np.asarray(points).reshape(-1, 2)
+        # Distance Between Every Consecutive Pair
+        is_linked = np.hypot(*(points[1:] - points[:-1]).T) < self.max_line_length
+        # Keep Points that Start or End a Linked Pair
+        keep = np.zeros(len(points), dtype=bool)
+        keep[:-1] |= is_linked
+        keep[1:] |= is_linked
+        return remove_duplicate_points(points[keep])
+
+    # Snaps Every Point to its Nearest Peg in One Call
+    def cluster(self, points, peg_index):
+        peg_ids = peg_index.snap(points)
+        return remove_duplicate_points(peg_index.pegs[peg_ids])
+
+    # Purpose: Load Lines and Build Peg Grid + Index, Reused Until lines.pkl Changes
+    # Output: Loaded Lines, Intersection Points, PegGrid.PegIndex
+    @classmethod
+    def load_peg_grid(cls, lines_location):
+        key = (os.path.abspath(lines_location), os.path.getmtime(lines_location))
+        if key not in cls.peg_grid_cache:
+            with open(lines_location, 'rb') as f:
+                loaded_lines = pickle.load(f)
+            intersection_points = cls.get_intersection_points_from_lines(loaded_lines)
+            cls.peg_grid_cache[key] = (loaded_lines, intersection_points, PegGrid.PegIndex(intersection_points))
+        return cls.peg_grid_cache[key]
+
+    # Get Intersection Points of Lines (Shared Batched Peg Grid Builder)
+    @classmethod
+    def get_intersection_points_from_lines(cls, lines):
+        return PegGrid.get_intersection_points_from_lines(lines, cls.vh_threshold)
 
 
 
@@ -188,23 +261,86 @@ class DrawPath:
             cv2.destroyWindow("Plotted Route")
         # Can not show and get image from self.board
 
-    def draw_path(self, image, points):
+    @staticmethod
+    def draw_path(image, points, color = (0, 255, 0)):
         for point1, point2 in zip(points, points[1:]):
-            image = cv2.line(image, point1, point2, [0, 255, 0], 2)
+            image = cv2.line(image, point1, point2, color, 2)
         return image
 
-    def draw_points(self, image, points, color = (0, 0, 255)):
+    @staticmethod
+    def draw_points(image, points, color = (0, 0, 255)):
         for point in points:
             image = cv2.circle(image, point, radius=2, color = color, thickness=2)
         return image
 
 
-def visualize_last_run():
+# Averages Many Runs Drawn on the Board (Same as Averaging DrawPath Images) in Constant Memory.
+# Board Decoded Once; Each Run Only Adds to Per Pixel Line / Point Counts.
+class PathOverlayAccumulator:
+
+    # Labels Drawn into the Scratch Layer (Points Drawn After Lines, Same as DrawPath)
+    line_label = 1
+    point_label = 2
+    # Pixels Past a Point Touched by Drawing (Line Thickness / Circle Radius + Thickness)
+    draw_margin = 4
+
+    def __init__(self, board_image = 'cached_data/board.jpg'):
+        # Board Jpg
+        self.board = cv2.imread(board_image)
+        if self.board is None:
+            raise Exception(f"Could not Load Board Image {board_image}")
+        height, width = self.board.shape[:2]
+        # Scratch Layer (Cleared Around Each Run After Use)
+        self.labels = np.zeros((height, width), dtype=np.uint8)
+        # Runs That Drew a Line / Point at Each Pixel
+        self.line_counts = np.zeros((height, width), dtype=np.float32)
+        self.point_counts = np.zeros((height, width), dtype=np.float32)
+        self.run_count = 0
+
+    def __len__(self):
+        return self.run_count
+
+    # Purpose: Rasterize One Run Like [[x, y], ...] and Add to Counts (Work Limited to Run's Bounding Box)
+    def add(self, points):
+        self.run_count += 1
+        if len(points) == 0:
+            return
+        points = [tuple(int(v) for v in point) for point in points]
+        DrawPath.draw_path(self.labels, points, color=self.line_label)
+        DrawPath.draw_points(self.labels, points, color=self.point_label)
+        # Bounding Box of Run
+        xs, ys = zip(*points)
+        height, width = self.labels.shape
+        x0 = max(min(xs) - self.draw_margin, 0); x1 = min(max(xs) + self.draw_margin + 1, width)
+        y0 = max(min(ys) - self.draw_margin, 0); y1 = min(max(ys) + self.draw_margin + 1, height)
+        if x1 <= x0 or y1 <= y0:
+            return
+        labels = self.labels[y0:y1, x0:x1]
+        self.line_counts[y0:y1, x0:x1] += labels == self.line_label
+        self.point_counts[y0:y1, x0:x1] += labels == self.point_label
+        labels[:] = 0
+
+    # Purpose: Fraction of Runs Passing Through Each Pixel
+    def heatmap(self):
+        return (self.line_counts + self.point_counts) / max(self.run_count, 1)
+
+    # Purpose: Average of Every Run Drawn on the Board
+    def average_image(self):
+        runs = max(self.run_count, 1)
+        line_fraction = (self.line_counts / runs)[..., None]
+        point_fraction = (self.point_counts / runs)[..., None]
+        average = self.board.astype(np.float32) * (1 - line_fraction - point_fraction) \
+            + np.array((0, 255, 0), dtype=np.float32) * line_fraction \
+            + np.array((0, 0, 255), dtype=np.float32) * point_fraction
+        return np.clip(np.round(average), 0, 255).astype(np.uint8)
+
+
+def visualize_last_run(data_folder = "piece_trials"):
      # Loads All Data
-    data_loader = DataLoader()
+    data_loader = DataLoader(data_folder)
     print(f"{len(data_loader)} files Loaded")
     # Get Last Run
-    point = data_loader.trials_loaded[-1]
+    point = data_loader[-1]
     # Get Processed Point
     processed_points = ClusterPointsToIntersections(point).chained_points
     # Show Chained Points
@@ -216,47 +352,91 @@ def visualize_all_runs():
     data_loader = DataLoader()
     print(f"{len(data_loader)} files Loaded")
     # Process Points For Each File
-    for point in data_loader.trials_loaded:
+    for point in data_loader:
         # Get Processed Point
         processed_points = ClusterPointsToIntersections(point).chained_points
         # Show Chained Points
         DrawPath(processed_points)
 
-# Brings Trial Files to Json Analyze File
-if __name__ == "__main__":
-    
-    # Loads All Data
-    data_loader = DataLoader()
-    print(f"{len(data_loader)} files Loaded")
-
-    # Initialize Processed Points
-    data_total = []
-    # Process Points For Each File
-    for point in data_loader.trials_loaded:
-        # Get Processed Point
-        processed_points = ClusterPointsToIntersections(point).chained_points
-        # # Show Chained Points
-        DrawPath(processed_points)
-        data_total.append(processed_points.tolist())
-
+# Purpose: Write Runs Like [chain, ...] into Json as 'Run {i}' (Keeps Other Keys Already There)
+def save_runs_json(runs, location = 'final_runs.json'):
     # Open Json Data
     json_loaded = None
-    if os.path.exists('final_runs.json'):
-        with open('final_runs.json', 'r') as f:
+    if os.path.exists(location):
+        with open(location, 'r') as f:
             json_loaded = json.loads(f.read())
     else:
         json_loaded = {}
     if json_loaded is None:
         raise Exception("Json Not Loaded Correctly")
-    
-    # Start Json Save Number
-    file_counter = 0
-    # Append New Data and Save Json
-    for data in data_total:
-        print(data)
+    # Append New Data
+    for file_counter, data in enumerate(runs):
         json_loaded[f'Run {file_counter}'] = data
-        file_counter += 1
-    
     # Save Json
-    with open('final_runs.json', 'w') as f:
+    with open(location, 'w') as f:
         json.dump(json_loaded, f, ensure_ascii=False, indent=4)
+
+
+# Peg Grids Inside a Worker Process Like {folder: (lines, intersection_points, peg_index)}
+worker_peg_grids = {}
+
+# Purpose: Hand Each Worker Every Peg Grid Once (Instead of With Every Chunk)
+def init_batch_worker(peg_grids):
+    worker_peg_grids.update(peg_grids)
+
+# Purpose: Chain a Chunk of Trials From One Folder (Runs in Worker Process)
+# Output: Chained Points per Trial Like [[[x, y], ...], ...]
+def chain_trials(folder, trials):
+    return [ClusterPointsToIntersections(trial, peg_grid=worker_peg_grids[folder], verbose=False).chained_points.tolist()
+            for trial in trials]
+
+# Purpose: Headless Reprocess of Many Data Folders (Each With piece_trials/ or trial_store/, cached_data/lines.pkl) Over a Process Pool
+# Input: Data Folders, Worker Processes (None = All Cores), Trials per Task
+# Output: Chained Runs per Folder Like {folder: [chain, ...]} (Also Written to Each Folder's final_runs.json Once)
+def batch_reprocess(folders, workers = None, chunk_size = 16):
+    # Load Trials and Build Each Peg Grid Once in the Parent
+    trials_by_folder = {folder: DataLoader(trials_folder(folder)) for folder in folders}
+    peg_grids = {folder: ClusterPointsToIntersections.load_peg_grid(os.path.join(folder, "cached_data", "lines.pkl"))
+                 for folder in folders}
+    runs_by_folder = {folder: [] for folder in folders}
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_batch_worker, initargs=(peg_grids,)) as executor:
+        # Chunks Submitted in Order, Results Collected in the Same Order
+        futures = [(folder, executor.submit(chain_trials, folder, trials[start:start + chunk_size]))
+                   for folder, trials in trials_by_folder.items()
+                   for start in range(0, len(trials), chunk_size)]
+        for folder, future in futures:
+            runs_by_folder[folder].extend(future.result())
+    for folder, runs in runs_by_folder.items():
+        save_runs_json(runs, os.path.join(folder, "final_runs.json"))
+        print(f"{folder}: {len(runs)} Runs Saved")
+    return runs_by_folder
+
+
+# Brings Trial Files to Json Analyze File
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bring trial files to final_runs.json")
+    parser.add_argument("folders", nargs="*",
+                        help="Headless batch mode: data folders like project_used_data/30mm (default: current folder, with preview)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--chunk-size", type=int, default=16, help="Trials per worker task")
+    args = parser.parse_args()
+
+    if len(args.folders) > 0:
+        batch_reprocess(args.folders, args.workers, args.chunk_size)
+    else:
+        # Loads All Data
+        data_loader = DataLoader()
+        print(f"{len(data_loader)} files Loaded")
+
+        # Initialize Processed Points
+        data_total = []
+        # Process Points For Each File
+        for point in data_loader:
+            # Get Processed Point
+            processed_points = ClusterPointsToIntersections(point).chained_points
+            # # Show Chained Points
+            DrawPath(processed_points)
+            data_total.append(processed_points.tolist())
+
+        # Save Json
+        save_runs_json(data_total)
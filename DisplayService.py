@@ -0,0 +1,156 @@
+import threading
+import time
+import cv2
+from StageTimer import StageTimer
+
+# Shows the Latest Annotated Frame of Every Window From One GUI Thread (HighGUI Isn't Thread Safe, so No Other
+# Thread Creates, Shows or Pumps Windows), Each at Most fps Times a Second so Repaints Never Hold Up Detection.
+# Several Boards Share One Service. Frames are Handed Over (Not Copied): show() Takes the Caller's Array and Gives
+# Back One the Window is Done With.
+class DisplayService:
+
+    # Purpose: Initialize Display State / Start GUI Thread
+    # Input: Frames per Second Shown per Window
+    def __init__(self, fps=30.0):
+        if fps is None or fps <= 0:
+            raise Exception("Display Needs a Positive Frame Rate (Skip the Display for Headless)")
+        self.frame_interval = 1.0 / fps
+        # Windows Like {title: DisplayWindow}
+        self.windows = {}
+        # Per Stage Timings of the GUI Loop Across All Windows (imshow, preview, waitkey)
+        self.stage_timer = StageTimer()
+        self.is_running = True
+        self.condition = threading.Condition()
+        self.display_thread = threading.Thread(target=self.run_display, daemon=True)
+        self.display_thread.start()
+
+    # Purpose: Add a Window (Created on the GUI Thread With its First Frame)
+    # Input: Window Title, Called Once (on the GUI Thread) After the First Frame is Shown (Trackbars, Mouse Callback),
+    #        Extra Window Like (title, get_image(last_seq) -> (seq, image or None)) or None
+    # Output: DisplayWindow (wants_frame / show / close)
+    def add_window(self, title, setup_window=None, preview=None):
+        with self.condition:
+            if title in self.windows:
+                raise Exception(f"Window Already Shown: {title}")
+            window = DisplayWindow(self, title, setup_window, preview)
+            self.windows[title] = window
+            return window
+
+    # Purpose: Stop GUI Thread
+    def stop(self):
+        with self.condition:
+            self.is_running = False
+            self.condition.notify_all()
+        if threading.current_thread() is not self.display_thread:
+            self.display_thread.join()
+
+    # Purpose: GUI Loop. Shows Each Handed Over Frame Once, Keeps Every Window Responsive in Between
+    def run_display(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: not self.is_running or any(
+                    window.latest_frame is not None or window.is_closed for window in self.windows.values()),
+                    self.frame_interval)
+                if not self.is_running:
+                    break
+                windows = list(self.windows.values())
+                frames = [window.take_frame() for window in windows]
+            self.stage_timer.begin_frame()
+            for window, frame in zip(windows, frames):
+                if window.is_closed:
+                    self.remove_window(window)
+                    continue
+                if frame is not None:
+                    window.show_now(frame)
+                    self.stage_timer.lap('imshow')
+                window.show_preview()
+                self.stage_timer.lap('preview')
+            cv2.waitKey(1)
+            self.stage_timer.lap('waitkey')
+            self.stage_timer.end_frame()
+        for window in list(self.windows.values()):
+            self.remove_window(window)
+
+    # Purpose: Forget Window and Destroy it (GUI Thread Only)
+    def remove_window(self, window):
+        with self.condition:
+            self.windows.pop(window.title, None)
+        if window.is_created:
+            cv2.destroyWindow(window.title)
+        if window.preview is not None and window.preview_seq > 0:
+            cv2.destroyWindow(window.preview[0])
+
+
+# One Window of a DisplayService (Plus its Optional Preview Window). wants_frame / show / close are Called by the
+# Frame's Owner; Everything Touching HighGUI Runs on the Service's GUI Thread.
+class DisplayWindow:
+
+    # Purpose: Initialize Window State (Use DisplayService.add_window)
+    def __init__(self, display, title, setup_window=None, preview=None):
+        self.display = display
+        self.title = title
+        self.setup_window = setup_window
+        self.preview = preview
+        self.preview_seq = 0
+        # Frame Waiting to be Shown / Frame Already Shown (Free for the Caller to Reuse)
+        self.latest_frame = None
+        self.free_frame = None
+        self.last_handoff_time = 0.0
+        self.shown_frames = 0
+        self.is_created = False
+        self.is_closed = False
+
+    # Shared GUI Loop Timings
+    @property
+    def stage_timer(self):
+        return self.display.stage_timer
+
+    # Purpose: Check Whether a Frame is Due (Callers Skip Annotating Frames That Won't be Shown)
+    def wants_frame(self):
+        return time.perf_counter() - self.last_handoff_time >= self.display.frame_interval
+
+    # Purpose: Hand Over an Annotated Frame (Caller Must Not Touch it Afterwards)
+    # Output: Array the Caller May Reuse (A Replaced Unshown Frame or One Already Shown), or None
+    def show(self, frame):
+        with self.display.condition:
+            spare = self.latest_frame
+            if spare is None:
+                spare, self.free_frame = self.free_frame, None
+            self.latest_frame = frame
+            self.last_handoff_time = time.perf_counter()
+            self.display.condition.notify_all()
+        return spare
+
+    # Purpose: Destroy Window (Done by the GUI Thread on its Next Pass)
+    def close(self):
+        with self.display.condition:
+            self.is_closed = True
+            self.display.condition.notify_all()
+
+    # Purpose: Frame Waiting to be Shown, Cleared (Called With the Service's Condition Held)
+    def take_frame(self):
+        frame, self.latest_frame = self.latest_frame, None
+        return frame
+
+    # Purpose: Show Frame, Then Give it Back for Reuse (GUI Thread Only)
+    def show_now(self, frame):
+        if not self.is_created:
+            cv2.namedWindow(self.title)
+            self.is_created = True
+        cv2.imshow(self.title, frame)
+        self.shown_frames += 1
+        # Window Has Its Own Copy Now -> Frame Free for Reuse
+        with self.display.condition:
+            self.free_frame = frame
+        if self.setup_window is not None:
+            setup_window, self.setup_window = self.setup_window, None
+            setup_window()
+
+    # Purpose: Show the Preview Window When it Has Something New (GUI Thread Only)
+    def show_preview(self):
+        if self.preview is None:
+            return
+        preview_title, get_image = self.preview
+        self.preview_seq, image = get_image(self.preview_seq)
+        if image is not None:
+            cv2.imshow(preview_title, image)
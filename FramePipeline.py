@@ -0,0 +1,93 @@
+import threading
+import time
+import numpy as np
+
+# Bounded Ring Buffer of Preallocated Frame Slots Between a Producer (Camera) and a Consumer (Analyzer)
+class FramePipeline:
+
+    # Policies When Full
+    DROP_OLDEST = "drop_oldest" # Overwrite the Oldest Unread Frame (Camera Never Waits)
+    BLOCK = "block" # Camera Waits Until the Analyzer Frees a Slot
+
+    # Purpose: Initialize Slots / Sequence Counters / Condition
+    def __init__(self, capacity=4, policy=DROP_OLDEST):
+        if capacity < 1:
+            raise Exception("Frame Pipeline Needs at Least One Slot")
+        if policy not in (self.DROP_OLDEST, self.BLOCK):
+            raise Exception(f"Unknown Frame Pipeline Policy: {policy}")
+        self.capacity = capacity
+        self.policy = policy
+        # Slots Allocated on First Frame (Frame Shape Unknown Until Then)
+        self.slots = None
+        self.slot_timestamps = np.zeros(capacity, dtype=np.int64)
+        # Frame n Lives in Slot n % capacity. Unread Frames Are read_seq ... write_seq - 1
+        self.write_seq = 0
+        self.read_seq = 0
+        # Frames Overwritten Before They Were Read
+        self.dropped_frames = 0
+        self.is_closed = False
+        self.condition = threading.Condition()
+
+    def __len__(self):
+        with self.condition:
+            return self.write_seq - self.read_seq
+
+    # Purpose: Copy Frame into Next Slot and Wake the Consumer
+    # Output: Sequence Number of Frame (None if Closed)
+    def put(self, frame, timestamp_ns=None):
+        if timestamp_ns is None:
+            timestamp_ns = time.monotonic_ns()
+        with self.condition:
+            if self.slots is None or self.slots[0].shape != frame.shape or self.slots[0].dtype != frame.dtype:
+                # Unread Frames Don't Survive Reallocation -> Blocking Waits for Them to be Read, Otherwise Dropped
+                if self.policy == self.BLOCK:
+                    self.condition.wait_for(lambda: self.write_seq == self.read_seq or self.is_closed)
+                self.dropped_frames += self.write_seq - self.read_seq
+                self.read_seq = self.write_seq
+                self.slots = [np.empty_like(frame) for _ in range(self.capacity)]
+            # Full -> Apply Policy
+            while self.write_seq - self.read_seq >= self.capacity and not self.is_closed:
+                if self.policy == self.BLOCK:
+                    self.condition.wait()
+                else:
+                    self.read_seq += 1
+                    self.dropped_frames += 1
+            if self.is_closed:
+                return None
+            slot = self.write_seq % self.capacity
+            np.copyto(self.slots[slot], frame)
+            self.slot_timestamps[slot] = timestamp_ns
+            seq = self.write_seq
+            self.write_seq += 1
+            self.condition.notify_all()
+            return seq
+
+    # Purpose: Wait for the Next Unread Frame and Copy it Out (Each Frame Returned Once)
+    # Input: Reusable Output Array (Allocated if None or Wrong Shape), Timeout in Seconds (None = Forever)
+    # Output: (Sequence Number, Capture Timestamp ns, Frame), (None, None, None) on Timeout / Close
+    def get(self, out=None, timeout=None):
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.write_seq > self.read_seq or self.is_closed, timeout):
+                return None, None, None
+            if self.write_seq == self.read_seq: # Closed and Drained
+                return None, None, None
+            slot = self.read_seq % self.capacity
+            if out is None or out.shape != self.slots[slot].shape or out.dtype != self.slots[slot].dtype:
+                out = np.empty_like(self.slots[slot])
+            np.copyto(out, self.slots[slot])
+            seq = self.read_seq
+            timestamp_ns = int(self.slot_timestamps[slot])
+            self.read_seq += 1
+            self.condition.notify_all()
+            return seq, timestamp_ns, out
+
+    # Purpose: Block Until At Least One Frame Has Been Captured (or Closed)
+    def wait_for_first_frame(self, timeout=None):
+        with self.condition:
+            return self.condition.wait_for(lambda: self.write_seq > 0 or self.is_closed, timeout)
+
+    # Purpose: Stop Pipeline and Wake Everyone Waiting
+    def close(self):
+        with self.condition:
+            self.is_closed = True
+            self.condition.notify_all()
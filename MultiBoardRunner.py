@@ -0,0 +1,98 @@
+import argparse
+import os
+import threading
+import time
+import keyboard
+from BoardViewer import BoardViewer
+from DisplayService import DisplayService
+from WebCamFeed import WebCamFeed
+
+# Runs Several Plinko Boards From One Host. Each Board Has its Own Camera, Data Folder, Lines and Mask, and Detects
+# on its Own Analyzer Thread (OpenCV Releases the GIL, so Boards Run in Parallel), at Most `workers` Boards at Once.
+# Every Board's Windows Share One GUI Thread (HighGUI Isn't Thread Safe). The Keyboard is Shared Too: Number Keys
+# Pick the Board, Every Other Key Only Goes to That Board.
+class MultiBoardRunner:
+
+    # Purpose: Start a BoardViewer per Board
+    # Input: Boards Like [{'device_index': 0, 'data_dir': 'board0'}, ...], Frame Size,
+    #        Boards Detecting at Once (None = All Cores), Seconds Between Stats Prints (None = Never),
+    #        Window Repaints per Second per Board (None = Headless)
+    def __init__(self, boards, frame_width=1000, frame_height=1000, workers=None, stats_interval=5.0, display_fps=30.0):
+        self.detection_slots = threading.BoundedSemaphore(workers or os.cpu_count())
+        self.display = DisplayService(display_fps) if display_fps is not None else None
+        self.board_viewers = []
+        for board in boards:
+            board_name = board.get('board_name', f"Board {board['device_index']}")
+            self.board_viewers.append(BoardViewer(frame_width, frame_height,
+                                                  device_index=board['device_index'],
+                                                  data_dir=board.get('data_dir', ""),
+                                                  board_name=board_name,
+                                                  display_fps=display_fps,
+                                                  display=self.display,
+                                                  poll_keyboard=False,
+                                                  detection_slots=self.detection_slots))
+        # Board Receiving Keys (Picked With 1 - 9)
+        self.active_board = 0
+        print(f"Keys Go to {self.board_viewers[0].board_name}. Press 1-{min(len(self.board_viewers), 9)} to Switch Boards")
+        self.keyboard_thread = threading.Thread(target=self.dispatch_keys, daemon=True)
+        self.keyboard_thread.start()
+        self.stats_interval = stats_interval
+        self.monitor_thread = threading.Thread(target=self.monitor_boards, daemon=True)
+        self.monitor_thread.start()
+
+    @property
+    def is_running(self):
+        return any(board_viewer.webcam_feed.is_running for board_viewer in self.board_viewers)
+
+    # Purpose: Throughput per Board Like {board_name: stats}
+    def get_throughput_stats(self):
+        return {board_viewer.board_name: board_viewer.get_throughput_stats() for board_viewer in self.board_viewers}
+
+    # Purpose: Send Each Key Press to the Active Board Only (Number Keys Switch the Active Board)
+    def dispatch_keys(self):
+        while self.is_running:
+            for index, board_viewer in enumerate(self.board_viewers[:9]):
+                if keyboard.is_pressed(str(index + 1)) and index != self.active_board:
+                    self.active_board = index
+                    print(f"Keys Go to {board_viewer.board_name}")
+            webcam_feed = self.board_viewers[self.active_board].webcam_feed
+            for key in WebCamFeed.keys:
+                if keyboard.is_pressed(key):
+                    # Waits Out the Key's Debounce Before the Next Poll
+                    webcam_feed.handle_key(key)
+                    break
+            time.sleep(0.01)
+
+    # Purpose: Print Per Board Throughput Every stats_interval Seconds Until Every Board Stops, Then Close Windows
+    def monitor_boards(self):
+        last_print_time = time.perf_counter()
+        while self.is_running:
+            time.sleep(0.5)
+            if self.stats_interval is None or time.perf_counter() - last_print_time < self.stats_interval:
+                continue
+            last_print_time = time.perf_counter()
+            for board_name, stats in self.get_throughput_stats().items():
+                print(f"{board_name}: {stats['fps']:.1f} fps, {stats['detection_ms']:.2f} ms/detection, "
+                      f"{stats['dropped_frames']} dropped, {stats['trials_queued']} trials queued, "
+                      f"{stats['displayed_frames']} displayed")
+        if self.display is not None:
+            self.display.stop()
+
+
+# Boards Given Like 0:board0 1:board1 (Device Index:Data Folder)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run several Plinko boards from one host")
+    parser.add_argument("boards", nargs="+", help="DEVICE_INDEX:DATA_DIR for each board (e.g. 0:board0 1:board1)")
+    parser.add_argument("--workers", type=int, default=None, help="Boards detecting at once (default: all cores)")
+    parser.add_argument("--frame-size", type=int, nargs=2, default=(1000, 1000), metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--stats-interval", type=float, default=5.0, help="Seconds between throughput prints")
+    parser.add_argument("--display-fps", type=float, default=30.0, help="Window repaints per second per board")
+    parser.add_argument("--headless", action="store_true", help="No windows (detection and recording only)")
+    args = parser.parse_args()
+
+    boards = []
+    for board in args.boards:
+        device_index, data_dir = board.split(":", 1)
+        boards.append({'device_index': int(device_index), 'data_dir': data_dir})
+    MultiBoardRunner(boards, args.frame_size[0], args.frame_size[1], args.workers, args.stats_interval,
+                     None if args.headless else args.display_fps)
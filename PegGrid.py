@@ -0,0 +1,158 @@
+import numpy as np
+
+# Vertical Horizontal Threshold Distance
+vh_threshold = 300
+
+# Purpose: Sort Lines by Horizontal and Vertical
+# Input: Lines Like [[(x1, y1), (x2, y2)], ...], Vertical Horizontal Threshold Distance
+# Output: Vertical Lines Array (V, 2, 2), Horizontal Lines Array (H, 2, 2)
+def split_lines(lines, vh_threshold=vh_threshold):
+    lines = np.asarray(lines, dtype=np.int64).reshape(-1, 2, 2)
+    # Line Extents
+    dx = np.abs(lines[:, 0, 0] - lines[:, 1, 0])
+    dy = np.abs(lines[:, 0, 1] - lines[:, 1, 1])
+    # Vertical Checked First (Same as Drawing Order)
+    is_vertical = dy > vh_threshold
+    is_horizontal = ~is_vertical & (dx > vh_threshold)
+    return lines[is_vertical], lines[is_horizontal]
+
+# Purpose: Line Coefficients (A, B, C) for Every Line at Once (Took From Online, Batched)
+# Input: Lines Array (N, 2, 2)
+# Output: A, B, C Arrays (N,)
+def line_coefficients(lines):
+    p1 = lines[:, 0].astype(np.float64)
+    p2 = lines[:, 1].astype(np.float64)
+    A = p1[:, 1] - p2[:, 1]
+    B = p2[:, 0] - p1[:, 0]
+    C = p1[:, 0]*p2[:, 1] - p2[:, 0]*p1[:, 1]
+    return A, B, -C
+
+# Purpose: Get Intersection Points (Pegs) of Every Horizontal x Vertical Line Pair in One Pass
+# Input: Lines Like [[(x1, y1), (x2, y2)], ...], Vertical Horizontal Threshold Distance
+# Output: Integer Array of Unique Pegs Like [[x1, y1], ...] (Horizontal Line Major Order)
+def get_intersection_points_from_lines(lines, vh_threshold=vh_threshold):
+    vertical_lines, horizontal_lines = split_lines(lines, vh_threshold)
+    if len(vertical_lines) == 0 or len(horizontal_lines) == 0:
+        return np.empty((0, 2), dtype=np.int64)
+
+    # Horizontal Lines Along Rows, Vertical Lines Along Columns
+    A1, B1, C1 = (c[:, None] for c in line_coefficients(horizontal_lines))
+    A2, B2, C2 = (c[None, :] for c in line_coefficients(vertical_lines))
+    # Determinants of Every Pair
+    D = A1 * B2 - B1 * A2
+    Dx = C1 * B2 - B1 * C2
+    Dy = A1 * C2 - C1 * A2
+    # Parallel Lines Have No Intersection
+    has_intersection = D != 0
+    safe_D = np.where(has_intersection, D, 1.0)
+    x = np.round(Dx / safe_D)
+    y = np.round(Dy / safe_D)
+
+    # Check if is Within Bounds (x Inside Horizontal Line, y Inside Vertical Line)
+    hx1 = horizontal_lines[:, 0, 0][:, None]; hx2 = horizontal_lines[:, 1, 0][:, None]
+    vy1 = vertical_lines[:, 0, 1][None, :]; vy2 = vertical_lines[:, 1, 1][None, :]
+    in_x = ((hx1 < x) & (x < hx2)) | ((hx2 < x) & (x < hx1))
+    in_y = ((vy1 < y) & (y < vy2)) | ((vy2 < y) & (y < vy1))
+    keep = has_intersection & in_x & in_y
+
+    # Flatten in Horizontal Line Major Order
+    points = np.stack((x[keep], y[keep]), axis=1).astype(np.int64)
+    if len(points) == 0:
+        return points
+    # Remove Duplicates, Keep First Occurrence Order
+    _, first_index = np.unique(points, axis=0, return_index=True)
+    return points[np.sort(first_index)]
+
+
+# Snaps Points to Their Nearest Peg. Uniform Grid (Cell Size = Half the Lattice Step) Built Once per Peg Grid, Each
+# Cell Holding Every Peg That Can be Nearest to Some Point Inside it, so a Lookup is One Cell and Always Exact.
+class PegIndex:
+
+    # Purpose: Find Candidate Pegs of Every Cell
+    # Input: Pegs Like [[x1, y1], ...], Cell Size (Defaults to Half the Lattice Step), Cells of Margin Around the Pegs
+    #        (Points Further Out Fall Back to Checking Every Peg)
+    def __init__(self, pegs, cell_size=None, margin=4):
+        self.pegs = np.asarray(pegs, dtype=np.int64).reshape(-1, 2)
+        self.cell_size = float(cell_size) if cell_size is not None else max(self.estimate_pitch(self.pegs) / 2, 1.0)
+        if len(self.pegs) == 0:
+            self.cells = np.empty((0, 0, 0), dtype=np.int64)
+            self.origin = np.zeros(2, dtype=np.int64)
+            return
+        # Grid Covers the Pegs Plus margin Cells on Every Side
+        peg_cells = np.floor(self.pegs / self.cell_size).astype(np.int64)
+        self.origin = peg_cells.min(axis=0) - margin
+        width, height = peg_cells.max(axis=0) - self.origin + margin + 1
+        # Cell Rectangles Like [[x0, y0], ...] (Cell Major Order, Same as cells[cx, cy])
+        cx, cy = np.meshgrid(np.arange(width), np.arange(height), indexing="ij")
+        corners = (np.stack((cx.ravel(), cy.ravel()), axis=1) + self.origin) * self.cell_size
+        # Squared Distance From Each Peg to the Closest / Farthest Point of Each Cell (Cells x Pegs)
+        low = corners[:, None, :] - self.pegs[None, :, :]
+        high = low + self.cell_size
+        closest = np.maximum(np.maximum(low, -high), 0)
+        farthest = np.maximum(np.abs(low), np.abs(high))
+        min_dist_2 = np.sum(closest**2, axis=2)
+        max_dist_2 = np.sum(farthest**2, axis=2)
+        # Every Point in a Cell is Within the Smallest Farthest Distance of Some Peg -> Pegs Starting Further Away
+        # Can't be Nearest
+        is_candidate = min_dist_2 <= max_dist_2.min(axis=1, keepdims=True)
+        # Dense Cell Table Like cells[cx, cy] = [peg_id, peg_id, -1, ...] (Peg Ids Ascending)
+        slots = is_candidate.sum(axis=1).max()
+        peg_ids = np.where(is_candidate, np.arange(len(self.pegs)), len(self.pegs))
+        peg_ids = np.sort(peg_ids, axis=1)[:, :slots]
+        peg_ids[peg_ids == len(self.pegs)] = -1
+        self.cells = peg_ids.reshape(width, height, slots)
+
+    def __len__(self):
+        return len(self.pegs)
+
+    # Purpose: Lattice Step (Larger of the Row / Column Spacing, Nearest Neighbor Distance Undercounts Uneven Grids)
+    @staticmethod
+    def estimate_pitch(pegs):
+        if len(pegs) < 2:
+            return 1.0
+        diff = np.abs(pegs[:, None, :] - pegs[None, :, :]).astype(np.float64)
+        dist_2 = np.sum(diff**2, axis=2)
+        np.fill_diagonal(dist_2, np.inf)
+        # Same Row / Column = Offset Across it Under Half the Median Nearest Neighbor Distance
+        tolerance = np.sqrt(np.median(dist_2.min(axis=1))) / 2
+        steps = [1.0]
+        for axis in (0, 1):
+            is_aligned = (diff[..., 1 - axis] < tolerance) & (diff[..., axis] > 0)
+            step = np.where(is_aligned, diff[..., axis], np.inf).min(axis=1)
+            step = step[np.isfinite(step)]
+            if len(step) > 0:
+                steps.append(float(np.median(step)))
+        return max(steps)
+
+    # Purpose: Nearest Peg for Every Point in One Call (Ties Go to the Lowest Peg Id)
+    # Input: Points Like [[x1, y1], ...]
+    # Output: Peg Ids Array (N,) (Index into self.pegs)
+    def snap(self, points):
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if len(points) == 0 or len(self.pegs) == 0:
+            return np.empty(0, dtype=np.int64)
+        width, height, _ = self.cells.shape
+        point_cells = np.floor(points / self.cell_size).astype(np.int64) - self.origin
+        in_grid = (point_cells[:, 0] >= 0) & (point_cells[:, 0] < width) & \
+                  (point_cells[:, 1] >= 0) & (point_cells[:, 1] < height)
+        cx = np.clip(point_cells[:, 0], 0, width - 1)
+        cy = np.clip(point_cells[:, 1], 0, height - 1)
+        peg_ids, _ = self.nearest_of(points, self.cells[cx, cy])
+        # Points Outside the Grid Check Every Peg
+        if not in_grid.all():
+            all_pegs = np.broadcast_to(np.arange(len(self.pegs)), (int((~in_grid).sum()), len(self.pegs)))
+            peg_ids[~in_grid], _ = self.nearest_of(points[~in_grid], all_pegs)
+        return peg_ids
+
+    # Purpose: Nearest Candidate Peg per Point (Candidates of -1 Ignored)
+    # Output: Peg Ids Array (N,), Squared Distances Array (N,)
+    def nearest_of(self, points, candidates):
+        valid = candidates >= 0
+        candidate_pegs = self.pegs[np.where(valid, candidates, 0)]
+        dist_2 = np.sum((candidate_pegs - points[:, None, :])**2, axis=2)
+        dist_2 = np.where(valid, dist_2, np.inf)
+        best_dist_2 = dist_2.min(axis=1)
+        # Lowest Peg Id Among Equally Close Candidates
+        is_best = valid & (dist_2 == best_dist_2[:, None])
+        peg_ids = np.where(is_best, candidates, len(self.pegs)).min(axis=1)
+        return peg_ids, best_dist_2
@@ -0,0 +1,135 @@
+import argparse
+import json
+import os
+import numpy as np
+from PegGrid import PegIndex
+from DataLoader import ClusterPointsToIntersections
+
+# Peg to Peg Transition Counts and Visit Heatmap Over the Peg Lattice, Built Up One Chained Path at a Time.
+# Transitions Kept Sparse as Sorted int64 Keys (from_peg * pegs + to_peg) With int64 Counts.
+class PegTransitions:
+
+    # Pending Transition Keys Merged Into the Sorted Arrays Once There Are This Many
+    merge_threshold = 1 << 16
+
+    # Purpose: Initialize Empty Counts for a Peg Grid
+    # Input: Pegs Like [[x1, y1], ...] or PegGrid.PegIndex
+    def __init__(self, pegs):
+        self.peg_index = pegs if isinstance(pegs, PegIndex) else PegIndex(pegs)
+        self.peg_count = len(self.peg_index)
+        # Paths Visiting / Starting at / Ending at Each Peg
+        self.visit_counts = np.zeros(self.peg_count, dtype=np.int64)
+        self.start_counts = np.zeros(self.peg_count, dtype=np.int64)
+        self.end_counts = np.zeros(self.peg_count, dtype=np.int64)
+        self.path_count = 0
+        # Sparse Transitions (Sorted Unique Keys, Counts) + Keys Not Merged Yet
+        self.keys = np.empty(0, dtype=np.int64)
+        self.counts = np.empty(0, dtype=np.int64)
+        self.pending_keys = []
+        self.pending_size = 0
+
+    @property
+    def pegs(self):
+        return self.peg_index.pegs
+
+    # Purpose: Add One Chained Path Like [[x, y], ...] (Points Snapped to Their Pegs)
+    def add_path(self, chained_points):
+        peg_ids = self.peg_index.snap(chained_points)
+        self.path_count += 1
+        if len(peg_ids) == 0:
+            return
+        self.visit_counts += np.bincount(np.unique(peg_ids), minlength=self.peg_count)
+        self.start_counts[peg_ids[0]] += 1
+        self.end_counts[peg_ids[-1]] += 1
+        if len(peg_ids) > 1:
+            self.pending_keys.append(peg_ids[:-1] * self.peg_count + peg_ids[1:])
+            self.pending_size += len(peg_ids) - 1
+            if self.pending_size >= self.merge_threshold:
+                self.merge_pending()
+
+    # Purpose: Add Many Chained Paths
+    def add_paths(self, paths):
+        for path in paths:
+            self.add_path(path)
+        return self
+
+    # Purpose: Fold Pending Keys Into Sorted Keys / Counts
+    def merge_pending(self):
+        if self.pending_size == 0:
+            return
+        new_keys, new_counts = np.unique(np.concatenate(self.pending_keys), return_counts=True)
+        keys = np.concatenate((self.keys, new_keys))
+        counts = np.concatenate((self.counts, new_counts))
+        self.keys, inverse = np.unique(keys, return_inverse=True)
+        self.counts = np.bincount(inverse, weights=counts, minlength=len(self.keys)).astype(np.int64)
+        self.pending_keys = []
+        self.pending_size = 0
+
+    # Purpose: Every Observed Transition
+    # Output: From Peg Ids, To Peg Ids, Counts (All Arrays Same Length)
+    def transitions(self):
+        self.merge_pending()
+        return self.keys // self.peg_count, self.keys % self.peg_count, self.counts
+
+    # Purpose: Dense (pegs x pegs) Transition Count Matrix (Only for Small Grids / Plotting)
+    def transition_matrix(self):
+        from_ids, to_ids, counts = self.transitions()
+        matrix = np.zeros((self.peg_count, self.peg_count), dtype=np.int64)
+        matrix[from_ids, to_ids] = counts
+        return matrix
+
+    # Purpose: Fraction of Paths Visiting Each Peg
+    def visit_heatmap(self):
+        return self.visit_counts / max(self.path_count, 1)
+
+    # Purpose: Per Peg Probability of Bouncing Left / Right (Next Peg's x Smaller / Larger)
+    # Output: Left Probability, Right Probability (NaN Where a Peg Was Never Left Sideways), Sideways Bounces per Peg
+    def bounce_probabilities(self):
+        from_ids, to_ids, counts = self.transitions()
+        dx = self.pegs[to_ids, 0] - self.pegs[from_ids, 0]
+        left = np.bincount(from_ids[dx < 0], weights=counts[dx < 0], minlength=self.peg_count)
+        right = np.bincount(from_ids[dx > 0], weights=counts[dx > 0], minlength=self.peg_count)
+        total = left + right
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return left / total, right / total, total.astype(np.int64)
+
+    # Purpose: Save Counts (Compare Precisions Later Without Re-Reading Json)
+    def save(self, location):
+        self.merge_pending()
+        np.savez(location, pegs=self.pegs, visit_counts=self.visit_counts, start_counts=self.start_counts,
+                 end_counts=self.end_counts, path_count=self.path_count, keys=self.keys, counts=self.counts)
+
+    @classmethod
+    def load(cls, location):
+        with np.load(location) as saved:
+            peg_transitions = cls(saved['pegs'])
+            peg_transitions.visit_counts = saved['visit_counts']
+            peg_transitions.start_counts = saved['start_counts']
+            peg_transitions.end_counts = saved['end_counts']
+            peg_transitions.path_count = int(saved['path_count'])
+            peg_transitions.keys = saved['keys']
+            peg_transitions.counts = saved['counts']
+        return peg_transitions
+
+    # Purpose: Build From a Data Folder's final_runs.json and cached_data/lines.pkl
+    @classmethod
+    def from_data_folder(cls, data_folder):
+        _, _, peg_index = ClusterPointsToIntersections.load_peg_grid(
+            os.path.join(data_folder, "cached_data", "lines.pkl"))
+        with open(os.path.join(data_folder, "final_runs.json"), 'r') as f:
+            runs = json.loads(f.read())
+        return cls(peg_index).add_paths(runs.values())
+
+
+# Saves cached_data/peg_transitions.npz per Data Folder and Prints a Short Summary
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build peg transition counts / bounce probabilities per data folder")
+    parser.add_argument("folders", nargs="+", help="Data folders like project_used_data/30mm")
+    args = parser.parse_args()
+
+    for folder in args.folders:
+        peg_transitions = PegTransitions.from_data_folder(folder)
+        peg_transitions.save(os.path.join(folder, "cached_data", "peg_transitions.npz"))
+        p_left, _, sideways = peg_transitions.bounce_probabilities()
+        print(f"{folder}: {peg_transitions.path_count} Paths, {int(peg_transitions.counts.sum())} Transitions, "
+              f"{int(np.count_nonzero(sideways))} Pegs Bounced Off, Mean Left Probability {np.nanmean(p_left):.3f}")
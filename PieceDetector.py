@@ -0,0 +1,300 @@
+import os
+import cv2
+import numpy as np
+from PieceTracker import PieceTracker
+
+# Finds the Piece in a Frame. No GUI (Shared by the Live BoardViewer and Offline Replay).
+class PieceDetector:
+
+    # Detection Modes
+    SATURATION = "saturation" # HSV Saturation / Value Thresholds (Bright Colored Chips)
+    BACKGROUND = "background" # Color Difference From a Downsampled Empty Board Reference (cached_data/background.jpg)
+
+    # Purpose: Initialize Thresholds / Tracker
+    # Input: Thresholds, Tracker On/Off, Detection Mode, Empty Board Image (Background Mode, None = First Frame),
+    #        Summed B + G + R Change a Pixel Needs to Count (0 - 765), Background Drift Follow Rate per Frame,
+    #        Background Downsampling Factor, Pyramid Downsampling Factor of Full Searches (Saturation Mode, 1 = Off),
+    #        Brightness Ratio to the Background That Can be Shadow Like (low, high), Largest Chromaticity Change of a
+    #        Shadow (None = No Shadow Test)
+    def __init__(self, saturation_cutoff=120, value_cutoff=140, contour_area_cutoff_min=200,
+                 contour_area_cutoff_max=100000, tracking_mode=True, detection_mode=SATURATION,
+                 background_location=None, diff_cutoff=60, background_learning_rate=0.02, background_scale=2,
+                 pyramid_scale=1, shadow_ratio_range=(0.4, 0.95), shadow_chroma_cutoff=0.05):
+        # Minimum Area Considered as Piece
+        self.contour_area_cutoff_min = contour_area_cutoff_min
+        # Maximum Area Considered as Piece
+        self.contour_area_cutoff_max = contour_area_cutoff_max
+        # Saturation Minimum
+        self.saturation_cutoff = saturation_cutoff
+        # Value Minimum (For Shadows)
+        self.value_cutoff = value_cutoff
+        # Tracker Mode: Search Near Last Centroid, Full Search Only When Piece is Lost (None = Always Full Search)
+        self.tracker = PieceTracker() if tracking_mode else None
+        if detection_mode not in (self.SATURATION, self.BACKGROUND):
+            raise Exception(f"Unknown Detection Mode: {detection_mode}")
+        self.detection_mode = detection_mode
+        # Background Mode: Minimum Change, Drift Rate, Reference (float32 BGR, Frame Size / background_scale)
+        self.diff_cutoff = diff_cutoff
+        self.background_learning_rate = background_learning_rate
+        self.background_scale = background_scale
+        self.background = None
+        self.background_frame_shape = None
+        # Background Mode: Darker Than the Reference but Same Hue -> Shadow, Not Piece
+        self.shadow_ratio_range = shadow_ratio_range
+        self.shadow_chroma_cutoff = shadow_chroma_cutoff
+        if background_location is not None and os.path.exists(background_location):
+            self.set_background(cv2.imread(background_location))
+        # Pyramid Mode: Full Searches Run on a Frame Shrunk by pyramid_scale, Then the Hit is Refined at Full Resolution
+        if pyramid_scale < 1 or pyramid_scale & (pyramid_scale - 1) != 0:
+            raise Exception(f"Pyramid Scale Must be a Power of 2: {pyramid_scale}")
+        self.pyramid_scale = pyramid_scale
+        # Optional StageTimer Charged per Step of find_contours (None = Not Timed)
+        self.stage_timer = None
+
+    # Purpose: Find Piece Center in Frame
+    # Input: Frame, Region of Interest Like (x0, y0, x1, y1) or None for Full Frame
+    # Output: (x, y) Center or None if No Piece, Contours Filtered by Area
+    def detect(self, image, roi=None):
+        contours, _ = self.find_piece(image, roi=roi)
+        if len(contours) == 0:
+            return None, contours
+        return self.get_center_of_contour(contours[0]), contours
+
+    # Purpose: Find Piece, Searching Only the Predicted Window While Tracking (Full Search if Lost)
+    # Input: Frame, Region of Interest Like (x0, y0, x1, y1) or None for Full Frame
+    # Output: Contours Filtered by Area (Frame Coordinates), Corresponding Hierarchy
+    def find_piece(self, image, roi=None):
+        if self.tracker is not None:
+            window = self.tracker.search_window(image.shape, roi)
+            if window is not None:
+                bounds = roi if roi is not None else (0, 0, image.shape[1], image.shape[0])
+                contours, hierarchy = self.filter_contours_by_area(*self.find_contours(image, roi=window))
+                # Piece Cut Off by the Window (Moved Further Than Predicted) -> Widen Toward the Cut Sides Once,
+                # Still Cut Off -> Full Search (a Clipped Contour's Centroid is Biased Toward the Window)
+                if len(contours) > 0 and any(self.clipped_sides(contours[0], window, bounds)):
+                    window = self.widen_window(contours[0], window, bounds)
+                    contours, hierarchy = self.filter_contours_by_area(*self.find_contours(image, roi=window))
+                    if len(contours) > 0 and any(self.clipped_sides(contours[0], window, bounds)):
+                        contours = []
+                if len(contours) > 0:
+                    self.tracker.update(self.get_center_of_contour(contours[0]))
+                    return contours, hierarchy
+        # Not Tracking / Lost -> Full Search
+        contours, hierarchy = self.search_frame(image, roi=roi)
+        if self.tracker is not None:
+            if len(contours) > 0:
+                self.tracker.update(self.get_center_of_contour(contours[0]))
+            else:
+                self.tracker.reset()
+        return contours, hierarchy
+
+    # Purpose: Sides of a Search Window a Contour Runs Into (Sides Lying on the ROI / Frame Edge Don't Count)
+    # Input: Contour, Window Like (x0, y0, x1, y1), Bounds Like (x0, y0, x1, y1)
+    # Output: (left, top, right, bottom) Booleans
+    def clipped_sides(self, contour, window, bounds):
+        # Background Mode Contours Come From a Downsampled Frame -> Within a Background Pixel of the Edge Counts
+        slack = self.background_scale if self.detection_mode == self.BACKGROUND else 1
+        (bx, by, bw, bh) = cv2.boundingRect(contour)
+        (x0, y0, x1, y1) = window
+        return (bx - x0 < slack and x0 > bounds[0], by - y0 < slack and y0 > bounds[1],
+                x1 - (bx + bw) < slack and x1 < bounds[2], y1 - (by + bh) < slack and y1 < bounds[3])
+
+    # Purpose: Window Grown Past Each Clipped Side by the Tracker's Search Radius (at Least Twice the Contour's Size)
+    # Output: Window Like (x0, y0, x1, y1), Clipped to Bounds
+    def widen_window(self, contour, window, bounds):
+        (_, _, bw, bh) = cv2.boundingRect(contour)
+        grow = max(self.tracker.search_radius, 2 * max(bw, bh))
+        left, top, right, bottom = self.clipped_sides(contour, window, bounds)
+        (x0, y0, x1, y1) = window
+        return (max(x0 - grow, bounds[0]) if left else x0, max(y0 - grow, bounds[1]) if top else y0,
+                min(x1 + grow, bounds[2]) if right else x1, min(y1 + grow, bounds[3]) if bottom else y1)
+
+    # Purpose: Full Search (Coarse to Fine in Saturation Mode When pyramid_scale > 1)
+    # Input: Frame, Region of Interest Like (x0, y0, x1, y1) or None for Full Frame
+    # Output: Contours Filtered by Area (Frame Coordinates), Corresponding Hierarchy
+    def search_frame(self, image, roi=None):
+        if self.pyramid_scale > 1 and self.detection_mode == self.SATURATION:
+            return self.find_contours_coarse_to_fine(image, roi=roi)
+        return self.filter_contours_by_area(*self.find_contours(image, roi=roi))
+
+    # Purpose: Pyramid Search. Saturation Method on a Shrunk Frame (Area Cutoffs Shrunk to Match), Then the First
+    #          Coarse Hit is Searched Again at Full Resolution in a Patch Around It (Exact Contour and Centroid)
+    # Input: Frame, Region of Interest Like (x0, y0, x1, y1) or None for Full Frame
+    # Output: Contours Filtered by Area (Frame Coordinates), Corresponding Hierarchy
+    def find_contours_coarse_to_fine(self, image, roi=None):
+        scale = self.pyramid_scale
+        (x0, y0, x1, y1) = roi if roi is not None else (0, 0, image.shape[1], image.shape[0])
+        width, height = (x1 - x0) // scale, (y1 - y0) // scale
+        if width == 0 or height == 0:
+            return self.filter_contours_by_area(*self.find_saturated_contours(image, roi=roi))
+        # Halved Level by Level (Exact 2x INTER_AREA is Much Faster Than One Big Step)
+        coarse = image[y0:y0 + height * scale, x0:x0 + width * scale]
+        level = 1
+        while level < scale:
+            level *= 2
+            coarse = cv2.resize(coarse, (width * scale // level, height * scale // level), interpolation=cv2.INTER_AREA)
+        if self.stage_timer is not None:
+            self.stage_timer.lap('downsample')
+        contours, hierarchy = self.filter_contours_by_area(*self.find_saturated_contours(coarse), area_scale=scale * scale)
+        if len(contours) == 0:
+            return contours, hierarchy
+        # Patch Around Coarse Blob (Plus a Couple of Coarse Pixels) in Frame Coordinates
+        (bx, by, bw, bh) = cv2.boundingRect(contours[0])
+        margin = 2 * scale
+        patch = (max(x0 + bx * scale - margin, x0), max(y0 + by * scale - margin, y0),
+                 min(x0 + (bx + bw) * scale + margin, x1), min(y0 + (by + bh) * scale + margin, y1))
+        refined, refined_hierarchy = self.filter_contours_by_area(*self.find_saturated_contours(image, roi=patch))
+        if len(refined) > 0:
+            return refined, refined_hierarchy
+        # Blob Only Passes at the Coarse Level -> Coarse Contours in Frame Coordinates
+        return [contour * scale + (x0 + scale // 2, y0 + scale // 2) for contour in contours], hierarchy
+
+    # Purpose: Contours of the Detection Mode in Use
+    # Input: Frame, Region of Interest Like (x0, y0, x1, y1) or None for Full Frame
+    # Output: Contours (Frame Coordinates), Hierarchy
+    def find_contours(self, image, roi=None):
+        if self.detection_mode == self.BACKGROUND:
+            return self.find_changed_contours(image, roi=roi)
+        return self.find_saturated_contours(image, roi=roi)
+
+    # Purpose: Saturation Method (All Bright Colored Chips)
+    # Input: Frame, Region of Interest Like (x0, y0, x1, y1) or None for Full Frame
+    # Output: Contours (Frame Coordinates), Hierarchy
+    def find_saturated_contours(self, image, roi=None):
+        offset = (0, 0)
+        if roi is not None:
+            # Slice is a View (No Copy), Contours Shifted Back to Frame Space Below
+            (x0, y0, x1, y1) = roi
+            image = image[y0:y1, x0:x1]
+            offset = (x0, y0)
+        stage_timer = self.stage_timer
+        # Convert to HSV (Hue, Saturation, Value) -> Value
+        hue, saturation, value = cv2.split(cv2.cvtColor(image, cv2.COLOR_BGR2HSV))
+        if stage_timer is not None:
+            stage_timer.lap('hsv')
+        #Threshold Saturation
+        _, saturation = cv2.threshold(saturation, self.saturation_cutoff, 255, cv2.THRESH_BINARY)
+        # Set Saturation Greyscale to 0 where value is less than value cutoff
+        # Get pixels lower than threshold (value)
+        _, value = cv2.threshold(value, self.value_cutoff, 255, cv2.THRESH_BINARY)
+        # Mask Saturation with Value
+        saturation = cv2.bitwise_and(saturation, saturation, mask=value)
+        if stage_timer is not None:
+            stage_timer.lap('threshold')
+        # Find Contours
+        contours, hierarchy = cv2.findContours(saturation, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE, offset=offset)
+        if stage_timer is not None:
+            stage_timer.lap('contours')
+        return contours, hierarchy
+
+    # Purpose: Filter Contours by Area (Closed Mandatory)
+    # Input: Contour List, Hierarchy List, Factor the Image Was Shrunk in Area (Cutoffs Divided by It)
+    # Output: Contours Filtered by Area, Corresponding Hierarchy
+    def filter_contours_by_area(self, contours, hierarchy, area_scale=1):
+        area_cutoff_min = self.contour_area_cutoff_min / area_scale
+        area_cutoff_max = self.contour_area_cutoff_max / area_scale
+        # New Empty Lists for Contours and Hierarchy
+        new_contours = []
+        new_hierarchy = [[]]
+        # Iterate through Contours
+        for i in range(len(contours)):
+            # If Contour Area (closed) is greater than value 1 and less than value 2, it is a piece
+            if (cv2.contourArea(contours[i]) > area_cutoff_min) and \
+                    (cv2.contourArea(contours[i]) < area_cutoff_max):
+                # Append the Piece Contours to the new_contours and new_hierarchy lists
+                new_contours.append(contours[i])
+                new_hierarchy[0].append(hierarchy[0][i])
+        # Return Contour and Hierarchy Lists
+        return new_contours, new_hierarchy
+
+    # Purpose: Finds Centroid using Pixel Values
+    # Input: Contour
+    # Output: Centroid Coordinates of Contour
+    def get_center_of_contour(self, contour):
+        # cv2.moments read data
+        m = cv2.moments(contour)
+        # Get X Coordinate, Get Y Coordinate
+        contour_center_x = int(m["m10"] / m["m00"])
+        contour_center_y = int(m["m01"] / m["m00"])
+        # return the centroid x and y coordinates
+        return contour_center_x, contour_center_y
+
+    # Purpose: Changed Pixels That are Only a Shadow: Darker Than the Reference by a Ratio in shadow_ratio_range With
+    #          Chromaticity (Channel / Channel Sum) Nearly Unchanged
+    # Input: Downsampled Frame (float32), Reference Region, Changed Mask
+    # Output: Row Indices, Column Indices of Shadow Pixels
+    def find_shadows(self, small, background, changed):
+        # Only Changed Pixels are Checked (Usually a Small Part of the Region)
+        points = cv2.findNonZero(changed)
+        if points is None:
+            return (), ()
+        points = points.reshape(-1, 2)
+        xs, ys = points[:, 0], points[:, 1]
+        pixels = small[ys, xs]
+        background_pixels = background[ys, xs]
+        brightness = pixels.sum(axis=1, keepdims=True) + 1
+        background_brightness = background_pixels.sum(axis=1, keepdims=True) + 1
+        ratio = brightness[:, 0] / background_brightness[:, 0]
+        chroma_change = np.abs(pixels / brightness - background_pixels / background_brightness).sum(axis=1)
+        low, high = self.shadow_ratio_range
+        is_shadow = (ratio >= low) & (ratio <= high) & (chroma_change < self.shadow_chroma_cutoff)
+        return ys[is_shadow], xs[is_shadow]
+
+    # Purpose: Use Image (BGR) as the Empty Board Reference
+    def set_background(self, image):
+        height, width = image.shape[:2]
+        self.background = self.downsample(image, (0, 0, width, height)).astype(np.float32)
+        self.background_frame_shape = image.shape
+
+    # Purpose: Region of Frame Shrunk by background_scale (Region Corners Already Multiples of the Scale)
+    def downsample(self, image, region):
+        (x0, y0, x1, y1) = region
+        scale = self.background_scale
+        image = image[y0:y1, x0:x1]
+        if scale == 1:
+            return image
+        return cv2.resize(image, ((x1 - x0) // scale, (y1 - y0) // scale), interpolation=cv2.INTER_AREA)
+
+    # Purpose: Background Method (Anything Differing in Color From the Empty Board, Except Shadows). Works on a
+    #          Downsampled Frame; the Reference Slowly Follows Lighting Drift Where Nothing Changed, so the Piece is
+    #          Never Blended In
+    # Input: Frame, Region of Interest Like (x0, y0, x1, y1) or None for Full Frame
+    # Output: Contours (Frame Coordinates), Hierarchy
+    def find_changed_contours(self, image, roi=None):
+        # No Reference Yet / Camera Resolution Differs From background.jpg -> Start From This Frame
+        if self.background is None or self.background_frame_shape != image.shape:
+            self.set_background(image)
+        scale = self.background_scale
+        height, width = self.background.shape[:2]
+        # Region in Background Pixels (Grown to Whole Background Pixels)
+        (x0, y0, x1, y1) = roi if roi is not None else (0, 0, width * scale, height * scale)
+        x0, y0 = x0 // scale, y0 // scale
+        x1, y1 = min(-(-x1 // scale), width), min(-(-y1 // scale), height)
+        if x1 <= x0 or y1 <= y0:
+            return (), None
+        stage_timer = self.stage_timer
+        small = self.downsample(image, (x0 * scale, y0 * scale, x1 * scale, y1 * scale))
+        # Slice is a View (Reference Updated in Place)
+        background = self.background[y0:y1, x0:x1]
+        if stage_timer is not None:
+            stage_timer.lap('downsample')
+        # Changed Pixels: |B| + |G| + |R| Difference From Reference (Summed in float32, uint8 Would Saturate at 255)
+        small_float = small.astype(np.float32)
+        channel_sum = np.ones((1, 3), dtype=np.float32)
+        changed = cv2.compare(cv2.transform(cv2.absdiff(small_float, background), channel_sum), self.diff_cutoff,
+                              cv2.CMP_GT)
+        # Reference Only Learns Where Nothing Changed (Shadows Included, so They're Never Blended In Either)
+        if self.background_learning_rate > 0:
+            cv2.accumulateWeighted(small, background, self.background_learning_rate, mask=cv2.bitwise_not(changed))
+        if self.shadow_chroma_cutoff is not None:
+            shadow_ys, shadow_xs = self.find_shadows(small_float, background, changed)
+            changed[shadow_ys, shadow_xs] = 0
+        if stage_timer is not None:
+            stage_timer.lap('threshold')
+        # Find Contours, Then Scale Back to Frame Coordinates (Centered in Each Background Pixel)
+        contours, hierarchy = cv2.findContours(changed, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE, offset=(x0, y0))
+        if scale != 1:
+            contours = tuple(contour * scale + scale // 2 for contour in contours)
+        if stage_timer is not None:
+            stage_timer.lap('contours')
+        return contours, hierarchy
@@ -0,0 +1,50 @@
+import numpy as np
+
+# Constant Velocity Predictor for the Piece. Gives a Small Search Window Around Where the Piece Should Be Next.
+class PieceTracker:
+
+    # Purpose: Initialize Tracker State
+    # Input: Window Half Size at Rest (px), Extra Half Size per px/frame of Speed, Velocity Smoothing (0-1)
+    def __init__(self, search_radius=60, speed_gain=2.0, velocity_smoothing=0.5):
+        self.search_radius = search_radius
+        self.speed_gain = speed_gain
+        self.velocity_smoothing = velocity_smoothing
+        self.reset()
+
+    # Purpose: Forget Piece (Next Search is Full Frame)
+    def reset(self):
+        self.last_center = None
+        self.velocity = np.zeros(2)
+
+    @property
+    def is_tracking(self):
+        return self.last_center is not None
+
+    # Purpose: Predicted Piece Position for Next Frame
+    def predict(self):
+        return self.last_center + self.velocity
+
+    # Purpose: Search Window Around Predicted Position, Clipped to Bounds
+    # Input: Frame Shape, Bounds Like (x0, y0, x1, y1) (None = Whole Frame)
+    # Output: Window Like (x0, y0, x1, y1), None if Not Tracking (Search Everything)
+    def search_window(self, frame_shape, bounds=None):
+        if not self.is_tracking:
+            return None
+        if bounds is None:
+            bounds = (0, 0, frame_shape[1], frame_shape[0])
+        x, y = self.predict()
+        radius = self.search_radius + self.speed_gain * float(np.hypot(*self.velocity))
+        x0 = int(max(x - radius, bounds[0])); x1 = int(min(x + radius, bounds[2]))
+        y0 = int(max(y - radius, bounds[1])); y1 = int(min(y + radius, bounds[3]))
+        # Prediction Left the Bounds
+        if x1 <= x0 or y1 <= y0:
+            return None
+        return (x0, y0, x1, y1)
+
+    # Purpose: Feed Newly Found Center (Updates Velocity)
+    def update(self, center):
+        center = np.asarray(center, dtype=np.float64)
+        if self.last_center is not None:
+            alpha = self.velocity_smoothing
+            self.velocity = alpha * (center - self.last_center) + (1 - alpha) * self.velocity
+        self.last_center = center
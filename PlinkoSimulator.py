@@ -0,0 +1,167 @@
+import argparse
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from PegTransitions import PegTransitions
+from VisualizeJsonData import load_precision_summary
+
+# Monte Carlo Plinko Board. Virtual Chips Random Walk the Peg Lattice, Each Step Drawn From the Recorded
+# Next Peg (or Stop) Frequencies of the Peg They're On, Leaving Out Pegs the Chip Already Hit (Recorded Chips
+# Never Hit a Peg Twice). All Chips of a Batch Step Together as NumPy Arrays.
+class PegLatticeSimulator:
+
+    # Mixes a Peg Into a Path Prefix Hash (64 Bit, Wraps)
+    hash_multiplier = np.uint64(0x9E3779B97F4A7C15)
+
+    # Purpose: Build Per Peg Outcome Tables From Recorded Transitions
+    # Input: PegTransitions, Longest Path Walked (Chips Still Moving Stop There)
+    def __init__(self, peg_transitions, max_steps = 100):
+        self.max_steps = max_steps
+        self.pegs = peg_transitions.pegs
+        self.peg_count = peg_transitions.peg_count
+        self.recorded_paths = peg_transitions.path_count
+        if peg_transitions.start_counts.sum() == 0:
+            raise Exception("No Recorded Paths to Calibrate From")
+
+        # Outcomes per Peg: Every Observed Next Peg + Stopping There (to = -1), Grouped by Peg
+        from_ids, to_ids, counts = peg_transitions.transitions()
+        end_pegs = np.flatnonzero(peg_transitions.end_counts)
+        outcome_from = np.concatenate((from_ids, end_pegs))
+        order = np.argsort(outcome_from, kind='stable')
+        outcome_from = outcome_from[order]
+        outcome_to = np.concatenate((to_ids, np.full(len(end_pegs), -1)))[order]
+        weights = np.concatenate((counts, peg_transitions.end_counts[end_pegs]))[order].astype(np.float64)
+        # Padded Tables Like [peg, outcome] (Padding is a Zero Weight Stop, Never Drawn)
+        outcome_counts = np.bincount(outcome_from, minlength=self.peg_count)
+        outcome_starts = np.cumsum(outcome_counts) - outcome_counts
+        slots = np.arange(len(outcome_from)) - outcome_starts[outcome_from]
+        self.outcome_to = np.full((self.peg_count, max(1, outcome_counts.max())), -1, dtype=np.int64)
+        self.outcome_weights = np.zeros(self.outcome_to.shape, dtype=np.float64)
+        self.outcome_to[outcome_from, slots] = outcome_to
+        self.outcome_weights[outcome_from, slots] = weights
+        # Starting Peg Distribution
+        self.start_cumulative = np.cumsum(peg_transitions.start_counts).astype(np.float64)
+
+    # Purpose: Calibrate From a Data Folder's final_runs.json and cached_data/lines.pkl
+    @classmethod
+    def from_data_folder(cls, data_folder, max_steps = 100):
+        return cls(PegTransitions.from_data_folder(data_folder), max_steps)
+
+    # Purpose: Drop One Batch of Chips
+    # Input: Chips, numpy Generator, Chips per Virtual Precision Run (for Variations vs Depth), Deepest Prefix
+    # Output: Dict of Summable Totals Like {'end_peg_counts': ..., 'length_counts': ..., 'variation_sums': ...,
+    #         'run_counts': ..., 'truncated_chips': ...}
+    def simulate_batch(self, chip_count, rng, trials_per_run = 100, max_depth = 15):
+        run_ids = np.arange(chip_count) // trials_per_run
+        variation_sums = np.zeros(max_depth, dtype=np.int64)
+        run_counts = np.zeros(max_depth, dtype=np.int64)
+        # Depth 0 (Empty Prefix) is One Variation per Run
+        variation_sums[0] = run_counts[0] = run_ids[-1] + 1 if chip_count > 0 else 0
+
+        current = np.searchsorted(self.start_cumulative, rng.random(chip_count) * self.start_cumulative[-1], side='right')
+        end_pegs = np.empty(chip_count, dtype=np.int64)
+        lengths = np.zeros(chip_count, dtype=np.int64)
+        prefix_hashes = np.zeros(chip_count, dtype=np.uint64)
+        active = np.arange(chip_count)
+        # Pegs Each Active Chip Has Hit Like [chip, peg]
+        visited = np.zeros((chip_count, self.peg_count), dtype=bool)
+        visited[active, current] = True
+        for step in range(self.max_steps):
+            if len(active) == 0:
+                break
+            lengths[active] = step + 1
+            # Unique Prefixes of Length step + 1 per Run (Sort by Run Then Hash, Count Changes)
+            if step + 1 < max_depth:
+                prefix_hashes[active] = (prefix_hashes[active] ^ (current + 1).astype(np.uint64)) * self.hash_multiplier
+                runs, hashes = run_ids[active], prefix_hashes[active]
+                order = np.lexsort((hashes, runs))
+                runs, hashes = runs[order], hashes[order]
+                first = np.ones(len(runs), dtype=bool)
+                first[1:] = (runs[1:] != runs[:-1]) | (hashes[1:] != hashes[:-1])
+                variation_sums[step + 1] = np.count_nonzero(first)
+                run_counts[step + 1] = len(np.unique(runs))
+
+            # Next Peg From the Outcomes Not Leading Back to a Hit Peg, Renormalized (None Left or Pegs Never Seen
+            # Before Stop the Chip)
+            outcomes = self.outcome_to[current]
+            weights = self.outcome_weights[current]
+            weights[visited[active[:, None], outcomes] & (outcomes >= 0)] = 0
+            cumulative = np.cumsum(weights, axis=1)
+            draws = rng.random(len(active)) * cumulative[:, -1]
+            outcome = np.minimum(np.count_nonzero(cumulative <= draws[:, None], axis=1), outcomes.shape[1] - 1)
+            next_pegs = np.where(cumulative[:, -1] > 0, outcomes[np.arange(len(active)), outcome], -1)
+            stopped = next_pegs < 0
+            end_pegs[active[stopped]] = current[stopped]
+            active, current = active[~stopped], next_pegs[~stopped]
+            visited[active, current] = True
+        end_pegs[active] = current
+
+        return {
+            'end_peg_counts': np.bincount(end_pegs, minlength=self.peg_count),
+            'length_counts': np.bincount(lengths, minlength=self.max_steps + 1),
+            'variation_sums': variation_sums,
+            'run_counts': run_counts,
+            'truncated_chips': len(active),
+        }
+
+    # Purpose: Drop Many Chips in Batches, Optionally Across Processes
+    # Input: Chips, Chips per Virtual Precision Run, Deepest Prefix, Chips per Batch (Rounded to Whole Runs),
+    #        Processes (None/1 = This Process), Seed
+    # Output: Dict Like VisualizeJsonData.load_precision_summary ('end_counts', 'end_bins', 'variations_vs_depth')
+    #         Plus 'end_peg_counts', 'length_counts', 'truncated_chips', 'chip_count'.
+    #         variations_vs_depth is the Mean Over Runs of trials_per_run Chips (Chips Shorter Than a Depth Left Out)
+    def run(self, chip_count, trials_per_run = 100, max_depth = 15, batch_size = 100000, workers = None, seed = None):
+        batch_size = max(trials_per_run, batch_size // trials_per_run * trials_per_run)
+        batch_sizes = [min(batch_size, chip_count - start) for start in range(0, chip_count, batch_size)]
+        rngs = [np.random.default_rng(child) for child in np.random.SeedSequence(seed).spawn(len(batch_sizes))]
+        batch_args = [(size, rng, trials_per_run, max_depth) for size, rng in zip(batch_sizes, rngs)]
+        if workers is None or workers <= 1:
+            results = [self.simulate_batch(*args) for args in batch_args]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(self.simulate_batch, *zip(*batch_args)))
+
+        totals = {key: sum(result[key] for result in results) for key in results[0]}
+        run_counts = np.maximum(totals['run_counts'], 1)
+        depth_count = int(np.count_nonzero(totals['run_counts']))
+        # End Distribution (One Bin per Pixel, Like get_end_distribution)
+        ending_x = self.pegs[:, 0]
+        end_x_range = ending_x[totals['end_peg_counts'] > 0]
+        end_bins = np.arange(end_x_range.min(), end_x_range.max() + 1)
+        end_counts, _ = np.histogram(ending_x, bins=end_bins, weights=totals['end_peg_counts'])
+        return {
+            'end_counts': end_counts.astype(np.int64),
+            'end_bins': end_bins,
+            'variations_vs_depth': (totals['variation_sums'] / run_counts)[:depth_count],
+            'end_peg_counts': totals['end_peg_counts'],
+            'length_counts': totals['length_counts'],
+            'truncated_chips': totals['truncated_chips'],
+            'chip_count': chip_count,
+        }
+
+
+# Simulates Each Data Folder and Prints Predicted vs Recorded Variations vs Depth
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Monte Carlo Plinko simulator calibrated from recorded trials")
+    parser.add_argument("folders", nargs="+", help="Data folders like project_used_data/30mm")
+    parser.add_argument("--chips", type=int, default=1000000, help="Virtual chips dropped per folder")
+    parser.add_argument("--trials-per-run", type=int, default=100, help="Chips per virtual precision run")
+    parser.add_argument("--max-depth", type=int, default=15)
+    parser.add_argument("--max-steps", type=int, default=100, help="Longest path walked")
+    parser.add_argument("--batch-size", type=int, default=100000, help="Chips stepped together")
+    parser.add_argument("--workers", type=int, default=None, help="Processes (default: this process only)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--save", action="store_true", help="Save to cached_data/simulated.npz per folder")
+    args = parser.parse_args()
+
+    for folder in args.folders:
+        simulator = PegLatticeSimulator.from_data_folder(folder, args.max_steps)
+        simulated = simulator.run(args.chips, args.trials_per_run, args.max_depth, args.batch_size, args.workers, args.seed)
+        recorded = load_precision_summary(folder, args.max_depth)
+        if args.save:
+            np.savez(os.path.join(folder, "cached_data", "simulated.npz"), **simulated)
+        mean_length = np.average(np.arange(len(simulated['length_counts'])), weights=simulated['length_counts'])
+        print(f"{folder}: {args.chips} Chips From {simulator.recorded_paths} Recorded Paths, "
+              f"Mean Path {mean_length:.1f} Pegs, {simulated['truncated_chips']} Truncated")
+        print(f"  Recorded Variations vs Depth:  {recorded['variations_vs_depth'].tolist()}")
+        print(f"  Simulated Variations vs Depth: {simulated['variations_vs_depth'].round(1).tolist()}")
@@ -0,0 +1,63 @@
+import numpy as np
+
+# Counts Unique Path Prefixes (Like Chess Openings) for Every Depth. Each Chain Walks the Trie Once.
+class PrefixTrie:
+
+    # Purpose: Initialize Root Node
+    # Input: Deepest Prefix Tracked (None = Whole Chains)
+    def __init__(self, max_depth = None):
+        self.max_depth = max_depth
+        # Per Node: Children Like {(x, y): node}, Chains Through Node, Depth
+        self.children = [{}]
+        self.counts = [0]
+        self.depths = [0]
+        self.chain_count = 0
+
+    def __len__(self):
+        return self.chain_count
+
+    # Purpose: Add One Chain Like [[x, y], ...]
+    def add(self, chain):
+        depth_limit = len(chain) if self.max_depth is None else min(len(chain), self.max_depth)
+        node = 0
+        self.counts[0] += 1
+        for depth in range(depth_limit):
+            move = tuple(chain[depth])
+            child = self.children[node].get(move)
+            if child is None:
+                child = len(self.counts)
+                self.children[node][move] = child
+                self.children.append({})
+                self.counts.append(0)
+                self.depths.append(depth + 1)
+            self.counts[child] += 1
+            node = child
+        self.chain_count += 1
+
+    # Purpose: Add Many Chains
+    def add_all(self, chains):
+        for chain in chains:
+            self.add(chain)
+        return self
+
+    # Purpose: Unique Prefixes at Each Depth (Depth 0 = Empty Prefix)
+    # Output: Array Like [1, 1, 4, 15, ...]
+    def unique_prefixes(self):
+        return np.bincount(np.array(self.depths), minlength=1)
+
+    # Purpose: Branching Entropy per Depth (Bits). Entropy of the Next Move Given the Prefix So Far,
+    #          Weighted by How Many Chains Share Each Prefix (Chains Ending at a Depth Don't Count There)
+    # Output: Array Like [H(move 1), H(move 2 | move 1), ...]
+    def branching_entropy(self):
+        deepest = max(self.depths)
+        entropy_sum = np.zeros(deepest)
+        continuing = np.zeros(deepest)
+        for node, children in enumerate(self.children):
+            if len(children) == 0:
+                continue
+            child_counts = np.array([self.counts[child] for child in children.values()], dtype=np.float64)
+            total = child_counts.sum()
+            p = child_counts / total
+            entropy_sum[self.depths[node]] += total * -np.sum(p * np.log2(p))
+            continuing[self.depths[node]] += total
+        return np.divide(entropy_sum, continuing, out=np.zeros(deepest), where=continuing > 0)
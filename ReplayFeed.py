@@ -0,0 +1,117 @@
+import argparse
+import glob
+import os
+import cv2
+from PieceDetector import PieceDetector
+from DataLoader import natural_keys, save_trial, next_piece_num
+
+# Image Types Read From an Image Sequence Folder
+image_extensions = ('.jpg', '.jpeg', '.png', '.bmp')
+
+# Headless Frame Source for Recorded Sessions (Video File or Folder of Images). Reads as Fast as Possible.
+class ReplayFeed:
+
+    # Purpose: Open Video File or List Image Sequence
+    def __init__(self, source):
+        self.source = source
+        self.image_locations = None
+        if os.path.isdir(source):
+            self.image_locations = [location for location in glob.glob(source + "/*")
+                                    if location.lower().endswith(image_extensions)]
+            self.image_locations.sort(key=natural_keys)
+        elif not os.path.exists(source):
+            raise Exception(f"Replay Source Not Found: {source}")
+
+    # Purpose: Yield Every Frame in Order (No Delay, No Window)
+    def __iter__(self):
+        if self.image_locations is not None:
+            for location in self.image_locations:
+                frame = cv2.imread(location)
+                if frame is not None:
+                    yield frame
+            return
+        vid = cv2.VideoCapture(self.source)
+        try:
+            while True:
+                ret, frame = vid.read()
+                if not ret:
+                    break
+                yield frame
+        finally:
+            vid.release()
+
+
+# Purpose: Run Detection Over a Recorded Source and Save Trajectories as piece{n}.pkl
+# Input: Source (Video / Image Folder), PieceDetector, Output Folder, First Piece Number (None = Next Free),
+#        ROI Like (x0, y0, x1, y1), Missed Frames That End a Trial (None = Whole Source is One Trial),
+#        Fewest Points Worth Saving
+# Output: Locations Saved
+def replay_trials(source, detector, data_folder="piece_trials", start_piece_num=None, roi=None,
+                  gap_frames=None, min_points=2):
+    piece_num = next_piece_num(data_folder) if start_piece_num is None else start_piece_num
+    saved_locations = []
+    # Array Like [(x1, y1), (x2, y2), ...]
+    current_piece_location_over_time = []
+    missed_frames = 0
+
+    def finish_trial():
+        nonlocal piece_num
+        if len(current_piece_location_over_time) >= min_points:
+            saved_locations.append(save_trial(list(current_piece_location_over_time), piece_num, data_folder))
+            piece_num += 1
+        current_piece_location_over_time.clear()
+
+    for frame in ReplayFeed(source):
+        center, _ = detector.detect(frame, roi=roi)
+        if center is not None:
+            current_piece_location_over_time.append(center)
+            missed_frames = 0
+        elif len(current_piece_location_over_time) > 0:
+            missed_frames += 1
+            # Piece Gone Long Enough -> Trial Over
+            if gap_frames is not None and missed_frames >= gap_frames:
+                finish_trial()
+    finish_trial()
+    return saved_locations
+
+
+# Reprocess Archived Sessions With New Thresholds
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded Plinko sessions through piece detection (headless)")
+    parser.add_argument("sources", nargs="+", help="Video files or folders of frame images")
+    parser.add_argument("--output", default="piece_trials", help="Folder to save piece{n}.pkl trials to")
+    parser.add_argument("--start-piece-num", type=int, default=None, help="First piece number (default: next free)")
+    parser.add_argument("--gap-frames", type=int, default=None,
+                        help="Frames without the piece that end a trial (default: one trial per source)")
+    parser.add_argument("--roi", type=int, nargs=4, default=None, metavar=("X0", "Y0", "X1", "Y1"))
+    parser.add_argument("--saturation-cutoff", type=int, default=120)
+    parser.add_argument("--value-cutoff", type=int, default=140)
+    parser.add_argument("--min-area", type=int, default=200)
+    parser.add_argument("--max-area", type=int, default=100000)
+    parser.add_argument("--no-tracking", action="store_true", help="Full frame search on every frame")
+    parser.add_argument("--detection-mode", choices=(PieceDetector.SATURATION, PieceDetector.BACKGROUND),
+                        default=PieceDetector.SATURATION)
+    parser.add_argument("--background", default=None,
+                        help="Empty board image for background mode (default: first frame of each source)")
+    parser.add_argument("--diff-cutoff", type=int, default=60,
+                        help="Summed B+G+R change that counts, 0-765 (background mode)")
+    parser.add_argument("--no-shadow-test", action="store_true",
+                        help="Count darker, same-hue pixels as changes too (background mode)")
+    parser.add_argument("--pyramid-scale", type=int, choices=(1, 2, 4), default=1,
+                        help="Run full searches at 1/2 or 1/4 size, then refine at full size (saturation mode)")
+    args = parser.parse_args()
+
+    piece_num = args.start_piece_num
+    for source in args.sources:
+        # Fresh Detector per Source (Tracker Shouldn't Carry Over Between Recordings)
+        detector = PieceDetector(args.saturation_cutoff, args.value_cutoff, args.min_area, args.max_area,
+                                 tracking_mode=not args.no_tracking, detection_mode=args.detection_mode,
+                                 background_location=args.background, diff_cutoff=args.diff_cutoff,
+                                 pyramid_scale=args.pyramid_scale,
+                                 shadow_chroma_cutoff=None if args.no_shadow_test else 0.05)
+        saved_locations = replay_trials(source, detector, args.output, piece_num,
+                                        roi=tuple(args.roi) if args.roi is not None else None,
+                                        gap_frames=args.gap_frames)
+        print(f"{source}: {len(saved_locations)} Trials Saved")
+        if piece_num is not None:
+            piece_num += len(saved_locations)
@@ -0,0 +1,97 @@
+import os
+import threading
+import cv2
+
+# Keeps the Latest Board Frame in Memory and Writes It to Disk Off the Capture Thread
+class SnapshotService:
+
+    # Purpose: Initialize Snapshot State / Start Background Writer
+    # Input: Location of Snapshot, Seconds Between Periodic Writes (None = Only on Request),
+    #        Write the First Frame Right Away (Otherwise Only Requested Frames are Written)
+    def __init__(self, location="cached_data/board.jpg", interval=10.0, write_first_frame=True):
+        self.location = location
+        self.interval = interval
+        self.write_first_frame = write_first_frame
+        # Latest Frame (Reference Only, Capture Loop Hands Over a New Array Each Read)
+        self.latest_frame = None
+        # Write Asked For (First Frame, Trial Stopped, etc.)
+        self.is_requested = False
+        # Requests Made / Requests Covered by a Finished Write (Lets Readers Wait for a Fresh File)
+        self.requested_snapshots = 0
+        self.written_snapshots = 0
+        self.is_writer_done = False
+        self.is_running = True
+        self.condition = threading.Condition()
+        self.writer_thread = threading.Thread(target=self.run_writer, daemon=True)
+        self.writer_thread.start()
+
+    # Purpose: Remember Most Recent Frame (No Encode, No Disk)
+    def update(self, frame):
+        with self.condition:
+            # Always Write the First Frame so the Snapshot is Never Stale From a Past Session
+            if self.latest_frame is None and self.write_first_frame:
+                self.is_requested = True
+                self.requested_snapshots += 1
+                self.condition.notify_all()
+            self.latest_frame = frame
+
+    # Purpose: Ask Writer to Save the Latest Frame As Soon As Possible
+    # Output: Ticket for wait_for_snapshot
+    def request_snapshot(self):
+        with self.condition:
+            self.is_requested = True
+            self.requested_snapshots += 1
+            self.condition.notify_all()
+            return self.requested_snapshots
+
+    # Purpose: Block Until a Frame Taken After the Request Has Been Written (or Writer Stopped / Timed Out)
+    # Output: True if Written
+    def wait_for_snapshot(self, ticket, timeout=None):
+        with self.condition:
+            self.condition.wait_for(lambda: self.written_snapshots >= ticket or self.is_writer_done, timeout)
+            return self.written_snapshots >= ticket
+
+    # Purpose: Stop Writer (Optionally Writing the Latest Frame One Last Time)
+    def stop(self, flush=True):
+        with self.condition:
+            self.is_requested = self.is_requested or flush
+            self.is_running = False
+            self.condition.notify_all()
+        if threading.current_thread() is not self.writer_thread:
+            self.writer_thread.join()
+
+    # Purpose: Writer Loop. Writes on Request or Every self.interval Seconds
+    def run_writer(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.is_requested or not self.is_running, self.interval)
+                frame = self.latest_frame
+                is_requested = self.is_requested
+                self.is_requested = False
+                requested_snapshots = self.requested_snapshots
+                is_running = self.is_running
+            # Requested, or Periodic (Stopping Without a Flush Writes Nothing)
+            if frame is not None and (is_requested or is_running):
+                self.write_atomic(frame)
+                with self.condition:
+                    self.written_snapshots = requested_snapshots
+                    self.condition.notify_all()
+            if not is_running:
+                break
+        with self.condition:
+            self.is_writer_done = True
+            self.condition.notify_all()
+
+    # Purpose: Encode to Temp File Then Rename, so Readers Never See a Half Written Image
+    def write_atomic(self, frame):
+        ret, encoded = cv2.imencode(os.path.splitext(self.location)[1], frame)
+        if not ret:
+            print(f"Could not Encode Snapshot for {self.location}")
+            return
+        directory = os.path.dirname(self.location)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_location = self.location + ".tmp"
+        with open(temp_location, 'wb') as f:
+            f.write(encoded.tobytes())
+        os.replace(temp_location, self.location)
@@ -0,0 +1,124 @@
+import csv
+import json
+import os
+import threading
+import time
+import cv2
+import numpy as np
+
+# Per Stage Timings of a Frame Loop With Rolling Percentiles. A Loop Calls begin_frame(), Then lap(stage) After
+# Each Stage (Time Since the Previous Lap Goes to That Stage), Then end_frame(). Laps of the Same Stage Within a
+# Frame Add Up. Only the Last window Frames are Kept per Stage.
+class StageTimer:
+
+    # Purpose: Initialize Rolling Windows / Counters
+    # Input: Frames Kept per Stage, Seconds Between Overlay Text Refreshes
+    def __init__(self, window = 512, overlay_interval = 0.5):
+        self.window = window
+        self.overlay_interval = overlay_interval
+        # Per Stage Ring Buffer of Seconds Like {stage: (array, [samples written])}
+        self.samples = {}
+        # Stage Totals of the Frame in Progress
+        self.frame_totals = {}
+        self.last_lap_ns = time.perf_counter_ns()
+        # Counters Like {'frames': n, 'dropped_frames': n, ...}
+        self.counters = {}
+        self.lock = threading.Lock()
+        self.overlay_lines = []
+        self.overlay_time = 0.0
+
+    # Purpose: Start Timing a Frame (Anything Before This Isn't Counted)
+    def begin_frame(self):
+        self.frame_totals = {}
+        self.last_lap_ns = time.perf_counter_ns()
+
+    # Purpose: Charge Time Since the Last Lap to a Stage
+    def lap(self, stage):
+        now = time.perf_counter_ns()
+        self.frame_totals[stage] = self.frame_totals.get(stage, 0) + now - self.last_lap_ns
+        self.last_lap_ns = now
+
+    # Purpose: Add a Measurement Not Timed by Laps (Like Capture to Detection Latency)
+    def record(self, stage, seconds):
+        self.frame_totals[stage] = self.frame_totals.get(stage, 0) + int(seconds * 1e9)
+
+    # Purpose: Push Frame's Stage Totals Into the Rolling Windows
+    def end_frame(self):
+        with self.lock:
+            for stage, total_ns in self.frame_totals.items():
+                if stage not in self.samples:
+                    self.samples[stage] = (np.zeros(self.window), [0])
+                values, written = self.samples[stage]
+                values[written[0] % self.window] = total_ns / 1e9
+                written[0] += 1
+        self.frame_totals = {}
+
+    # Purpose: Set / Add to a Counter
+    def set_counter(self, name, value):
+        self.counters[name] = value
+
+    def count(self, name, amount = 1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    # Purpose: Rolling Stats per Stage
+    # Output: Dict Like {stage: {'p50_ms': x, 'p95_ms': x, 'p99_ms': x, 'mean_ms': x, 'samples': n}, ...}
+    def summary(self):
+        with self.lock:
+            windows = {stage: values[:min(written[0], self.window)].copy() for stage, (values, written) in self.samples.items()}
+        summary = {}
+        for stage, values in windows.items():
+            p50, p95, p99 = np.percentile(values, [50, 95, 99]) * 1000
+            summary[stage] = {'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p99, 'mean_ms': values.mean() * 1000,
+                              'samples': len(values)}
+        return summary
+
+    # Purpose: Draw Stats in the Corner of a Frame (Text Recomputed Every overlay_interval Seconds)
+    # Input: Image (Drawn on in Place), Other Timers to Show Under This One Like {'capture': StageTimer}
+    def draw_overlay(self, image, other_timers = None, origin = (10, 70)):
+        now = time.perf_counter()
+        if now - self.overlay_time >= self.overlay_interval:
+            self.overlay_time = now
+            self.overlay_lines = self.format_lines()
+            for name, timer in (other_timers or {}).items():
+                self.overlay_lines += [f"[{name}]"] + timer.format_lines()
+        x, y = origin
+        for line in self.overlay_lines:
+            cv2.putText(image, line, (x, y), cv2.FONT_HERSHEY_SIMPLEX, fontScale=0.4, color=(0, 255, 255), thickness=1)
+            y += 14
+        return image
+
+    # Purpose: One Text Line per Stage + One for Counters
+    def format_lines(self):
+        lines = [f"{stage:>20s} p50 {stats['p50_ms']:6.2f}  p95 {stats['p95_ms']:6.2f}  p99 {stats['p99_ms']:6.2f} ms"
+                 for stage, stats in self.summary().items()]
+        if len(self.counters) > 0:
+            lines.append("  ".join(f"{name} {value}" for name, value in self.counters.items()))
+        return lines
+
+
+# Purpose: Write Several Timers' Stats to a Log (.csv Appends One Row per Stage, Anything Else Rewritten as JSON)
+# Input: Location, Timers Like {'analyze': StageTimer, 'capture': StageTimer}
+def export_timers(location, timers):
+    folder = os.path.dirname(location)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    now = time.time()
+    if location.endswith(".csv"):
+        write_header = not os.path.exists(location)
+        with open(location, 'a', newline='') as f:
+            writer = csv.writer(f)
+            if write_header:
+                writer.writerow(['time', 'timer', 'stage', 'p50_ms', 'p95_ms', 'p99_ms', 'mean_ms', 'samples'])
+            for name, timer in timers.items():
+                for stage, stats in timer.summary().items():
+                    writer.writerow([f"{now:.3f}", name, stage, f"{stats['p50_ms']:.4f}", f"{stats['p95_ms']:.4f}",
+                                     f"{stats['p99_ms']:.4f}", f"{stats['mean_ms']:.4f}", stats['samples']])
+                # Counters Go in the samples Column
+                for counter, value in timer.counters.items():
+                    writer.writerow([f"{now:.3f}", name, counter, '', '', '', '', value])
+    else:
+        log = {'time': now}
+        for name, timer in timers.items():
+            log[name] = {'stages': timer.summary(), 'counters': dict(timer.counters)}
+        with open(location, 'w') as f:
+            json.dump(log, f, indent=2)
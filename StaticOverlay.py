@@ -0,0 +1,38 @@
+import numpy as np
+
+# Cached Drawing of Things That Don't Change Between Frames (Lines, Pegs). Rendered Once Into a Layer, Kept as the
+# Drawn Pixels' Coordinates and Colors, Then Written Onto Each Frame in One Vectorized Assignment (No Frame Copies).
+class StaticOverlay:
+
+    # Purpose: Initialize Empty Overlay
+    def __init__(self):
+        # Whatever the Layer Was Built From (Like (lines_version, frame shape)), None = Never Built
+        self.key = None
+        self.ys = np.empty(0, dtype=np.intp)
+        self.xs = np.empty(0, dtype=np.intp)
+        self.colors = np.empty((0, 3), dtype=np.uint8)
+        # Same Pixels as Element Indices Into a Flattened (Contiguous) Frame, With Their Channel Values
+        self.elements = np.empty(0, dtype=np.intp)
+        self.values = np.empty(0, dtype=np.uint8)
+
+    # Purpose: Check Whether Layer Needs Rebuilding
+    def is_stale(self, key):
+        return self.key != key
+
+    # Purpose: Keep Drawn (Non Black) Pixels of a Freshly Rendered Layer
+    # Input: Layer (Same Shape as Frames, Black Where Nothing is Drawn), What it Was Built From
+    def update(self, layer, key):
+        self.ys, self.xs = np.nonzero(layer.any(axis=2))
+        self.colors = layer[self.ys, self.xs]
+        channels = layer.shape[2]
+        self.elements = ((self.ys * layer.shape[1] + self.xs)[:, None] * channels + np.arange(channels)).ravel()
+        self.values = self.colors.ravel()
+        self.key = key
+
+    # Purpose: Draw Layer Onto Frame in Place
+    def composite(self, image):
+        if image.flags.c_contiguous:
+            image.reshape(-1)[self.elements] = self.values
+        else:
+            image[self.ys, self.xs] = self.colors
+        return image
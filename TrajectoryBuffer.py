@@ -0,0 +1,78 @@
+import numpy as np
+
+# One Row per Analyzed Frame of a Trial
+trajectory_dtype = np.dtype([
+    ('frame_seq', '<i8'),     # FramePipeline Sequence Number
+    ('timestamp_ns', '<i8'),  # Capture Time (time.monotonic_ns)
+    ('x', '<i4'),             # Piece Center (0 When Not Detected)
+    ('y', '<i4'),
+    ('area', '<f4'),          # Piece Contour Area (0 When Not Detected)
+    ('detected', '?'),        # Piece Found in This Frame
+])
+
+# Growable Preallocated Trajectory of a Trial (Structured Array, Doubles When Full).
+# Rows are Written Field by Field Through Column Views Bound Once per Allocation (No Per Row Tuple);
+# detach() Hands the Filled Rows Off Without Copying.
+class TrajectoryBuffer:
+
+    # Purpose: Preallocate Rows
+    def __init__(self, capacity = 1024):
+        self.capacity = capacity
+        self.allocate(capacity)
+        self.size = 0
+
+    # Purpose: New Storage and its Column Views (Like self.x = self.samples['x'])
+    def allocate(self, capacity):
+        self.samples = np.empty(capacity, dtype=trajectory_dtype)
+        for name in trajectory_dtype.names:
+            setattr(self, name, self.samples[name])
+
+    def __len__(self):
+        return self.size
+
+    # Purpose: Write Next Row (Undetected Frames Keep Their Timestamp but No Position)
+    def append(self, frame_seq, timestamp_ns, x = 0, y = 0, area = 0.0, detected = True):
+        size = self.size
+        if size == len(self.samples):
+            filled = self.samples
+            self.allocate(2 * size)
+            self.samples[:size] = filled
+        self.frame_seq[size] = frame_seq
+        self.timestamp_ns[size] = timestamp_ns
+        self.x[size] = x
+        self.y[size] = y
+        self.area[size] = area
+        self.detected[size] = detected
+        self.size = size + 1
+
+    # Number of Rows Where the Piece Was Found
+    @property
+    def detected_count(self):
+        return int(np.count_nonzero(self.detected[:self.size]))
+
+    # Purpose: Filled Rows as a View (Valid Until the Next append / clear)
+    def view(self):
+        return self.samples[:self.size]
+
+    # Purpose: Hand Off Filled Rows (No Copy) and Start Over on Fresh Storage
+    # Output: Structured Array of trajectory_dtype
+    def detach(self):
+        samples = self.samples[:self.size]
+        self.allocate(self.capacity)
+        self.size = 0
+        return samples
+
+    # Purpose: Forget Rows (Storage Reused)
+    def clear(self):
+        self.size = 0
+
+
+# Purpose: Check Whether a Trial is Structured Samples (Rather Than Points Like [(x1, y1), ...])
+def is_samples(trial):
+    return isinstance(trial, np.ndarray) and trial.dtype.names is not None and 'detected' in trial.dtype.names
+
+# Purpose: Positions of Detected Rows
+# Output: Array (N, 2) Like [[x1, y1], ...]
+def detected_points(samples):
+    detected = samples[samples['detected']]
+    return np.stack((detected['x'], detected['y']), axis=1)
@@ -0,0 +1,138 @@
+import argparse
+import glob
+import os
+import pickle
+import re
+import numpy as np
+
+# Columnar Trial Store. One Folder Holding Every Trial:
+#   coords.i16     All Points Back to Back Like [x1, y1, x2, y2, ...] (int16)
+#   offsets.i64    End Offset (in Points) of Each Trial Into coords
+#   piece_nums.i64 Piece Number of Each Trial
+# Trials Are Read as Zero-Copy Slices of a Memory Mapped coords. coords is Never Shrunk (Mapped Files Can't be
+# Truncated on Windows, and Readers' Maps Must Stay Valid): Its Length is the Last Offset, Bytes Past That are Unused
+# Space the Next Append Writes Over.
+class TrajectoryStore:
+
+    coords_file = "coords.i16"
+    offsets_file = "offsets.i64"
+    piece_nums_file = "piece_nums.i64"
+
+    # Purpose: Open (and Create if Needed) Store Folder
+    def __init__(self, folder = "trial_store"):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+        for name in (self.coords_file, self.offsets_file, self.piece_nums_file):
+            if not os.path.exists(self.path(name)):
+                open(self.path(name), 'wb').close()
+        self.coords = None
+        self.refresh()
+
+    # Purpose: Check Whether Folder is a Store (Rather Than piece{n}.pkl Files)
+    @classmethod
+    def is_store(cls, folder):
+        return os.path.exists(os.path.join(folder, cls.offsets_file))
+
+    def path(self, name):
+        return os.path.join(self.folder, name)
+
+    # Purpose: Re-Read Index (Picks Up Trials Appended by Someone Else)
+    def refresh(self):
+        self.offsets = np.fromfile(self.path(self.offsets_file), dtype='<i8')
+        self.piece_nums = np.fromfile(self.path(self.piece_nums_file), dtype='<i8')
+        # Index Files Written One After the Other -> Only Trust Trials Present in Both
+        count = min(len(self.offsets), len(self.piece_nums))
+        self.offsets = self.offsets[:count]
+        self.piece_nums = self.piece_nums[:count]
+
+    def __len__(self):
+        return len(self.offsets)
+
+    # Purpose: Trial as an (N, 2) int16 View Into the Memory Map (No Copy)
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"Trial {index} Not in Store ({len(self)} Trials)")
+        start = int(self.offsets[index - 1]) if index > 0 else 0
+        end = int(self.offsets[index])
+        return self.mapped_coords(end)[start:end]
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    # Number of Points Stored Across All Trials
+    @property
+    def total_points(self):
+        return int(self.offsets[-1]) if len(self.offsets) > 0 else 0
+
+    # Purpose: Memory Map coords (Re-Mapped Only When It Has Grown Past What is Mapped)
+    def mapped_coords(self, points_needed):
+        if points_needed == 0:
+            return np.empty((0, 2), dtype='<i2')
+        if self.coords is None or len(self.coords) < points_needed:
+            self.coords = np.memmap(self.path(self.coords_file), dtype='<i2', mode='r', shape=(self.total_points, 2))
+        return self.coords
+
+    # Purpose: Add Trial Like [(x1, y1), ...] to End of Store
+    # Output: Index of Trial
+    def append(self, trajectory, piece_num = None):
+        trajectory = np.asarray(trajectory).reshape(-1, 2)
+        if len(trajectory) > 0 and (trajectory.min() < np.iinfo(np.int16).min or trajectory.max() > np.iinfo(np.int16).max):
+            raise Exception("Trajectory Coordinates Don't Fit in int16")
+        if piece_num is None:
+            piece_num = int(self.piece_nums[-1]) + 1 if len(self.piece_nums) > 0 else 0
+        end = self.total_points + len(trajectory)
+        # Points Written Right After the Last Indexed Trial (Over Anything Popped / Left by an Interrupted Append),
+        # Then Added to Index
+        with open(self.path(self.coords_file), 'r+b') as f:
+            f.seek(self.total_points * 4)
+            f.write(trajectory.astype('<i2').tobytes())
+        with open(self.path(self.offsets_file), 'ab') as f:
+            f.write(np.array([end], dtype='<i8').tobytes())
+        with open(self.path(self.piece_nums_file), 'ab') as f:
+            f.write(np.array([piece_num], dtype='<i8').tobytes())
+        self.offsets = np.append(self.offsets, end)
+        self.piece_nums = np.append(self.piece_nums, piece_num)
+        return len(self) - 1
+
+    # Purpose: Remove Last Trial (Only the Index Shrinks, its Points are Left for the Next Append to Reuse)
+    def pop(self):
+        if len(self) == 0:
+            return
+        self.offsets = self.offsets[:-1]
+        self.piece_nums = self.piece_nums[:-1]
+        for name, size in ((self.offsets_file, len(self.offsets) * 8), (self.piece_nums_file, len(self.piece_nums) * 8)):
+            with open(self.path(name), 'r+b') as f:
+                f.truncate(size)
+
+
+# Purpose: Copy piece{n}.pkl Trials Into a Store (Piece Numbers Already in the Store are Skipped)
+# Output: Number of Trials Imported
+def import_piece_trials(piece_trials_folder = "piece_trials", store_folder = "trial_store"):
+    store = TrajectoryStore(store_folder)
+    existing_piece_nums = set(store.piece_nums.tolist())
+    # Sorted by Piece Number
+    piece_locations = sorted(glob.glob(piece_trials_folder + "/piece*.pkl"),
+                             key=lambda location: int(re.findall(r'\d+', os.path.basename(location))[-1]))
+    imported = 0
+    for location in piece_locations:
+        piece_num = int(re.findall(r'\d+', os.path.basename(location))[-1])
+        if piece_num in existing_piece_nums:
+            continue
+        with open(location, "rb") as f:
+            store.append(pickle.load(f), piece_num)
+        imported += 1
+    return imported
+
+
+# Import Tool for Existing piece_trials Folders
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import piece{n}.pkl trials into a columnar trial store")
+    parser.add_argument("piece_trials_folder", help="Folder of piece{n}.pkl files")
+    parser.add_argument("store_folder", help="Store folder to create or append to")
+    args = parser.parse_args()
+    print(f"{import_piece_trials(args.piece_trials_folder, args.store_folder)} Trials Imported Into {args.store_folder}")
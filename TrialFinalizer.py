@@ -0,0 +1,82 @@
+import queue
+import threading
+from DataLoader import save_trial, ClusterPointsToIntersections, DrawPath
+from TrajectoryBuffer import is_samples, detected_points
+
+# Finishes Trials Off the Analysis Thread: Save -> Snap to Pegs -> Chain -> Render Preview. Trials Queue Up in Order.
+# Peg Transitions Come From the Saved Runs (PegTransitions.from_data_folder), Not From Here.
+class TrialFinalizer:
+
+    # Purpose: Initialize Queue / Start Worker
+    # Input: ..., SnapshotService Writing board_image (Previews Wait for the Snapshot Requested When the Trial Stopped)
+    def __init__(self, data_folder = "piece_trials", lines_location = "cached_data/lines.pkl",
+                 board_image = "cached_data/board.jpg", snapshot_service = None, snapshot_timeout = 5.0):
+        self.data_folder = data_folder
+        self.lines_location = lines_location
+        self.board_image = board_image
+        self.snapshot_service = snapshot_service
+        self.snapshot_timeout = snapshot_timeout
+        # Unbounded (A Burst of Trials is Never Dropped)
+        self.queue = queue.Queue()
+        # Most Recent Rendered Route (Shown by the Viewer's Own Thread)
+        self.preview_lock = threading.Lock()
+        self.latest_preview = None
+        self.preview_seq = 0
+        # Counters
+        self.finalized_trials = 0
+        self.failed_trials = 0
+        self.worker_thread = threading.Thread(target=self.run)
+        self.worker_thread.start()
+
+    # Purpose: Queue Trial Like [(x1, y1), ...] or TrajectoryBuffer Samples (Returns Immediately, Caller Hands Them Over)
+    # Input: ..., Ticket From snapshot_service.request_snapshot() (None = Use board_image as it Is)
+    def submit(self, trajectory, piece_num, snapshot_ticket = None):
+        self.queue.put((trajectory, piece_num, snapshot_ticket))
+
+    # Purpose: Worker Loop
+    def run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                # Closed
+                if item is None:
+                    break
+                self.finalize(*item)
+                self.finalized_trials += 1
+            except Exception as e:
+                self.failed_trials += 1
+                print(f"Could not Finalize Trial: {e}")
+            finally:
+                self.queue.task_done()
+
+    # Purpose: Save First (So Data is Kept Even if Post-Processing Fails), Then Chain and Render Preview
+    def finalize(self, trajectory, piece_num, snapshot_ticket = None):
+        save_trial(trajectory, piece_num, self.data_folder)
+        points = detected_points(trajectory) if is_samples(trajectory) else trajectory
+        clustered = ClusterPointsToIntersections(points, self.lines_location, verbose=False)
+        chained_points = clustered.chained_points
+        # Board Image From After the Trial, Not the Previous Snapshot
+        if snapshot_ticket is not None and self.snapshot_service is not None:
+            if not self.snapshot_service.wait_for_snapshot(snapshot_ticket, self.snapshot_timeout):
+                print(f"Board Snapshot for Piece {piece_num} Not Written in Time. Preview Uses the Previous One")
+        preview = DrawPath(chained_points, board_image=self.board_image, show=False).board
+        with self.preview_lock:
+            self.latest_preview = preview
+            self.preview_seq += 1
+
+    # Purpose: Newest Preview if Newer Than last_seq
+    # Output: (Sequence Number, Image or None if Nothing New)
+    def get_preview(self, last_seq):
+        with self.preview_lock:
+            if self.preview_seq == last_seq:
+                return last_seq, None
+            return self.preview_seq, self.latest_preview
+
+    # Number of Trials Waiting
+    def __len__(self):
+        return self.queue.qsize()
+
+    # Purpose: Finish Everything Queued, Then Stop Worker
+    def close(self):
+        self.queue.put(None)
+        self.worker_thread.join()
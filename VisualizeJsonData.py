@@ -1,8 +1,14 @@
 import matplotlib.pyplot as plt
 import json
+import os
+import hashlib
 import cv2
 import numpy as np
-from DataLoader import DrawPath
+from DataLoader import PathOverlayAccumulator
+from PrefixTrie import PrefixTrie
+
+# Bump When Any Summary Below Changes (Invalidates Every Analytics Cache)
+analytics_version = 3
 
 def load_json(location = "final_runs.json"):
     data = None
@@ -12,6 +18,72 @@ def load_json(location = "final_runs.json"):
         return data
     raise Exception("Could not Load Json")
 
+# Purpose: Last X Coordinate of Every Run
+def get_ending_x_coordinates(all_chains):
+    return np.array([chain[-1][0] for chain in all_chains])
+
+# Purpose: Histogram of Ending X Coordinates (One Bin per Pixel, Like the End Distribution Plot)
+# Output: Counts, Bin Edges
+def get_end_distribution(ending_x_coordinates):
+    return np.histogram(ending_x_coordinates, bins=np.arange(np.min(ending_x_coordinates), np.max(ending_x_coordinates)+1))
+
+# Purpose: Average Image of Every Run's Path Drawn on the Board (Streamed, Memory Doesn't Grow With Runs)
+def get_average_path_image(all_chains, board_image):
+    overlay = PathOverlayAccumulator(board_image)
+    for coords in all_chains:
+        overlay.add(coords)
+    return overlay.average_image()
+
+# Purpose: Unique Combinations Within X Number of Moves (Like Chess Openings) -> The less here the more consistent
+# Output: Unique Variations per Depth Like [1, 1, 4, 15, ...] (Depths Every Chain Reaches, Up to max_depth)
+def get_variations_vs_depth(all_chains, max_depth = 15):
+    depth_count = min(max_depth, min([len(chain) for chain in all_chains]))
+    prefix_trie = PrefixTrie(max_depth = depth_count - 1).add_all(all_chains)
+    return prefix_trie.unique_prefixes()[:depth_count].tolist()
+
+# Purpose: Branching Entropy (Bits) of the Next Move per Depth, Up to max_depth
+def get_branching_entropy(all_chains, max_depth = 15):
+    return PrefixTrie(max_depth = max_depth).add_all(all_chains).branching_entropy()
+
+# Purpose: Content Hash of Every Input File (Plus Analysis Settings)
+def get_inputs_hash(locations, max_depth):
+    sha = hashlib.sha256(f"{analytics_version}:{max_depth}".encode())
+    for location in locations:
+        with open(location, 'rb') as f:
+            sha.update(hashlib.sha256(f.read()).digest())
+    return sha.hexdigest()
+
+# Purpose: Per Precision Summary (End Distribution, Variations vs Depth, Average Path Image),
+#          Recomputed Only When final_runs.json or board.jpg Change
+# Output: Dict Like {'ending_x_coordinates': ..., 'end_counts': ..., 'end_bins': ..., 'variations_vs_depth': ...,
+#                    'branching_entropy': ..., 'average_path': ...}
+def load_precision_summary(data_folder, max_depth = 15):
+    json_location = os.path.join(data_folder, "final_runs.json")
+    board_image = os.path.join(data_folder, "cached_data", "board.jpg")
+    cache_location = os.path.join(data_folder, "cached_data", "analytics.npz")
+    inputs_hash = get_inputs_hash([json_location, board_image], max_depth)
+
+    # Cached and Inputs Unchanged
+    if os.path.exists(cache_location):
+        with np.load(cache_location) as cached:
+            if str(cached['inputs_hash']) == inputs_hash:
+                return {key: cached[key] for key in cached.files if key != 'inputs_hash'}
+
+    # Load Json
+    all_chains = list(load_json(location = json_location).values())
+    ending_x_coordinates = get_ending_x_coordinates(all_chains)
+    end_counts, end_bins = get_end_distribution(ending_x_coordinates)
+    summary = {
+        'ending_x_coordinates': ending_x_coordinates,
+        'end_counts': end_counts,
+        'end_bins': end_bins,
+        'variations_vs_depth': np.array(get_variations_vs_depth(all_chains, max_depth)),
+        'branching_entropy': get_branching_entropy(all_chains, max_depth),
+        'average_path': get_average_path_image(all_chains, board_image),
+    }
+    np.savez(cache_location, inputs_hash=inputs_hash, **summary)
+    return summary
+
 if __name__ == "__main__":
 
     # For Loading Data
@@ -19,75 +91,32 @@ if __name__ == "__main__":
 
     # Saved Lists
     variations_vs_depth_mm = {} # Like {'30mm': [1, 1, 4, 15, ...], ...}
+    branching_entropy_mm = {} # Like {'30mm': [0.0, 1.2, ...], ...}
 
     for mm in mm_list:
 
-        # Load Json
-        data = load_json(location = f"project_used_data/{mm}/final_runs.json")
-
-        all_chains = data.values()
-        all_chains = list(all_chains)
+        # Load Summary (Cached Until Inputs Change)
+        summary = load_precision_summary(f"project_used_data/{mm}")
 
         '''
             Plots End Distribution
         '''
-        # Get Ending X Coordinates
-        ending_x_coordinates = []
-        for coords in data.values():
-            end_coord = coords[-1]
-            end_x = end_coord[0]
-            ending_x_coordinates.append(end_x)
-        plt.hist(ending_x_coordinates, bins=np.arange(np.min(ending_x_coordinates), np.max(ending_x_coordinates)+1), rwidth=10)
+        plt.hist(summary['end_bins'][:-1], bins=summary['end_bins'], weights=summary['end_counts'], rwidth=10)
         plt.show()
 
         '''
             Plots Overlay of Runs
         '''
-        # Get All Images of Paths
-        boards = []
-        for coords in data.values():
-            boards.append(DrawPath(coords, show = False, board_image=f'project_used_data/{mm}/cached_data/board.jpg').board)
-        
-        # Average Images
-        avg_image = boards[0]
-        for i in range(len(boards)):
-            if i == 0:
-                pass
-            else:
-                alpha = 1.0/(i + 1)
-                beta = 1.0 - alpha
-                avg_image = cv2.addWeighted(boards[i], alpha, avg_image, beta, 0.0)
-
-        cv2.imshow('Final Image', avg_image)
+        cv2.imshow('Final Image', summary['average_path'])
         # cv2.imwrite('average_image.jpg', avg_image)
         cv2.waitKey(0)
 
-
-        '''
-            Unique Combinations Within X Number of Moves (Like Chess Openings) -> The less here the more consistent
-        '''
-        # Initialize moves_unique
-        max_depth = 15
-        moves_unique = {} # Like {'combinations depth 1': [[[x, y]]], 'combinations depth 2': [[[x, y], [x, y]], [[x, y], [x, y]], ...], ...}
-        for i in range(min(max_depth, min([len(chain) for chain in all_chains]))):
-            moves_unique[f'Combinations Depth {i}'] = []
-        # Iterate Through all_chains
-        for i in range(len(all_chains)):
-            for j in range(min(max_depth,  min([len(chain) for chain in all_chains]))):
-                # Declare Chain so Far
-                chain_so_far = all_chains[i][0:j]
-                if chain_so_far not in moves_unique[f"Combinations Depth {j}"]:
-                    moves_unique[f"Combinations Depth {j}"].append(chain_so_far)
-
         # Initialize This Variations Per Depth
-        variations_vs_depth_mm[mm] = []
-
-        for key, value in moves_unique.items():
-            value = list(value)
-            variations_vs_depth_mm[mm].append(len(value))
-            # print(f"{key} Length: {len(value)}")
+        variations_vs_depth_mm[mm] = summary['variations_vs_depth'].tolist()
+        branching_entropy_mm[mm] = summary['branching_entropy'].round(3).tolist()
 
     print(variations_vs_depth_mm)
+    print(branching_entropy_mm)
 
     # Plots Variations vs Depth for Different Precisions
     for key, value in variations_vs_depth_mm.items():
@@ -1,5 +1,4 @@
 from datetime import datetime
-import glob
 import cv2
 import keyboard
 import threading
@@ -8,27 +7,58 @@ import time
 import pickle
 import os
 import re
+from FramePipeline import FramePipeline
+from SnapshotService import SnapshotService
+from StageTimer import StageTimer
+from DataLoader import delete_last_trial
 
 # Encapsulates WebCam Feed. (Get Current Frame through web_cam_feed.current_frame)
 class WebCamFeed:
 
+    # Keys Acted On (Checked in This Order)
+    keys = ('q', 'r', 'u', 's', 'd', 'b')
+
     # Title of Frame
-    frame_title = "Plinko Board Viewer [('q') to Quit, ('r') to Reset Mask, ('u') to Undo Line, ('s') to Start/Stop Trial, ('d') to Delete Last Trial]"
+    frame_title = "Plinko Board Viewer [('q') to Quit, ('r') to Reset Mask, ('u') to Undo Line, ('s') to Start/Stop Trial, ('d') to Delete Last Trial, ('b') to Capture Empty Board]"
 
     # Purpose: Initialize Video Capture / Member Variables
-    def __init__(self, frame_width, frame_height):
+    def __init__(self, frame_width, frame_height, frame_buffer_size=4, frame_drop_policy=FramePipeline.DROP_OLDEST, snapshot_interval=10.0, roi_mode=True, data_folder=None,
+                 device_index=0, data_dir="", board_name=None, poll_keyboard=True):
         print("Initializing Webcam Stream...")
-        # Video Capture Variable initialize and set size(0 = webcam live feed, cv2.CAP_DSHOW = Direct Show (video input)
+        # Video Capture Variable initialize and set size(device_index 0 = first webcam, cv2.CAP_DSHOW = Direct Show (video input)
         # (also makes loading much faster)
-        self.vid = cv2.VideoCapture(0, cv2.CAP_DSHOW)
+        self.vid = cv2.VideoCapture(device_index, cv2.CAP_DSHOW)
         print("Done.")
         # Frame width and height (not image capture height/width)
         self.vid.set(cv2.CAP_PROP_FRAME_WIDTH, frame_width)
         self.vid.set(cv2.CAP_PROP_FRAME_HEIGHT, frame_height)
+        # Window Title (Unique per Board so Each Board Gets its Own Window)
+        if board_name is not None:
+            self.frame_title = f"{WebCamFeed.frame_title} - {board_name}"
+        # Per Board Files (data_dir "" = Current Folder, Like a Single Board Setup)
+        self.cached_data_folder = os.path.join(data_dir, "cached_data")
+        self.lines_location = os.path.join(self.cached_data_folder, "lines.pkl")
+        # Where Trials are Saved (piece{n}.pkl Folder or TrajectoryStore)
+        self.data_folder = data_folder if data_folder is not None else os.path.join(data_dir, "piece_trials")
         # Running Live Capture
         self.is_running = True
+        # Read Keys Straight From the Keyboard (False = Keys Only Arrive Through handle_key, Like With Several Boards
+        # Where One Keyboard is Shared)
+        self.poll_keyboard = poll_keyboard
         # Current Frame initialize to empty
         self.current_frame = np.array([None])
+        # Captured Frames Handed to the Analyzer (Each Frame Read Once)
+        self.frame_pipeline = FramePipeline(frame_buffer_size, frame_drop_policy)
+        # Board Snapshot (cached_data/board.jpg) Written in the Background, Not Every Frame
+        self.snapshot_service = SnapshotService(os.path.join(self.cached_data_folder, "board.jpg"), snapshot_interval)
+        # Empty Board Reference for Background Detection (Kept Apart From board.jpg, Which May Show the Piece / a Hand).
+        # Only Captured When ('b') is Pressed; background_version Bumped Each Time
+        self.background_location = os.path.join(self.cached_data_folder, "background.jpg")
+        self.background_service = SnapshotService(self.background_location, interval=None, write_first_frame=False)
+        self.background_frame = None
+        self.background_version = 0
+        # Per Stage Timings of the Capture Loop (read, snapshot, mask, put)
+        self.stage_timer = StageTimer()
         # Initialize Capture Thread and Start it
         print("Starting Live Capture...")
         self.capture_thread = threading.Thread(target=self.run_live_feed).start()
@@ -38,6 +68,9 @@ class WebCamFeed:
         self.crop_start = (0, 0)  # Reset when lift mouse button
         self.crop_end = (0, 0)  # Reset when lift mouse button
         self.mask = None  # Calculated Mask to Apply to Each Frame
+        # ROI Mode: Crop Becomes a Rectangle the Analyzer Slices Instead of a Mask Over Every Frame
+        self.roi_mode = roi_mode
+        self.roi = None  # Like (x0, y0, x1, y1) in Frame Coordinates
 
         # Lines Draw
         # Array for lines like [[(x1, y1), (x2, y2)], [...]...]
@@ -45,37 +78,42 @@ class WebCamFeed:
         self.line_start = (0, 0)
         self.line_end = (0, 0)
         self.lines_coords = []
+        # Bumped Whenever self.lines_coords Changes (Lets Viewers Cache Anything Built From Lines)
+        self.lines_version = 0
 
         # Timer (Start and Stop Trials)
         self.is_timing = False
         self.start_time = 0
+        # Board Snapshot Requested When the Last Trial Stopped (Ticket for SnapshotService.wait_for_snapshot)
+        self.trial_snapshot_ticket = None
 
         # Load Lines
-        if os.path.exists('cached_data/lines.pkl'):
+        if os.path.exists(self.lines_location):
             self.load_lines()
 
-        # Initialize Cropping Feature
-        self.prompt_crop = threading.Thread(target=self.prompt_crop).start()
-
     # Purpose: Camera Loop.
     # Output: Set Member (self.current_frame) equal to most recent frame (read later in Board Viewer)
     def run_live_feed(self):
         # While is running
         while self.is_running:
+            self.stage_timer.begin_frame()
             # ret = True if frame read correctly, frame = numpy array of frame read
             ret, frame = self.vid.read()
-            # Save Image for Use Later if Wanted
-            cv2.imwrite("cached_data/board.jpg", frame)
+            # Capture Time (Carried With the Frame for Capture to Detection Latency)
+            capture_ns = time.monotonic_ns()
+            self.stage_timer.lap('read')
             # If the frame is not read correctly, stop frame reading (ret==False if frame not red correctly)
             if not ret:
                 print("Frame not Read Correctly. Please Check Camera is Plugged in Correctly. Quitting Frame Read")
                 # If not read correctly, stop trying (no camera, etc)
                 self.is_running = False
-                # Close Device (Best Practice)
-                self.vid.release()
                 # Break Running Loop
                 break
 
+            # Keep Image for Use Later if Wanted (Written to Disk by Snapshot Service)
+            self.snapshot_service.update(frame)
+            self.stage_timer.lap('snapshot')
+
             # Set Member variable current frame to frame (to be accessed elsewhere when requested)
             if self.mask is not None:  # If there is a mask
                 frame = cv2.bitwise_and(frame, frame, mask=self.mask)
@@ -83,36 +121,60 @@ class WebCamFeed:
                 self.current_frame = frame
             else:  # If there isn't a mask, just set member variable equal to current frame
                 self.current_frame = frame
-            # Wait 16ms in between frames (a little more than 60fps (ideally))
-            cv2.waitKey(16)
-            if keyboard.is_pressed('q'):
-                self.is_running = False
-                # Close Device (Best Practice)
-                self.vid.release()
-                break
-            elif keyboard.is_pressed('r'):  # Clear Mask
-                self.mask = None
-            elif keyboard.is_pressed('u'):
-                self.lines_coords = self.lines_coords[:-1]
-                time.sleep(0.1)
-                # Save Lines
-                self.save_lines()
-            elif keyboard.is_pressed('s'):
-                if not self.is_timing:
-                    self.start_time = datetime.now()
-                    self.is_timing = True
-                    time.sleep(0.3)
-                else:
-                    self.start_time = 0
-                    self.is_timing = False
-                    time.sleep(0.3)
-            elif keyboard.is_pressed('d'):
-                trial_locations = glob.glob('piece_trials/*')
-                trial_locations.sort(key=self.natural_keys)
-                if len(trial_locations) > 0:
-                    os.remove(trial_locations[-1])
-                time.sleep(0.3)
+            self.stage_timer.lap('mask')
+            # Hand Frame to Analyzer
+            self.frame_pipeline.put(self.current_frame, capture_ns)
+            self.stage_timer.lap('put')
+            # No Sleep / waitKey Here: read() Already Blocks Until the Camera's Next Frame (Windows are Pumped by the
+            # Display's GUI Thread)
+            self.stage_timer.set_counter('dropped_frames', self.frame_pipeline.dropped_frames)
+            self.stage_timer.end_frame()
+            if self.poll_keyboard:
+                for key in self.keys:
+                    if keyboard.is_pressed(key):
+                        self.handle_key(key)
+                        break
+        # Stopped ('q', Camera Lost) -> Close Everything Down
+        self.frame_pipeline.close()
+        self.snapshot_service.stop()
+        self.background_service.stop(flush=False)
+        # Close Device (Best Practice)
+        self.vid.release()
 
+    # Purpose: Act on a Key Meant for This Board (From the Keyboard Poll Above, or Dispatched by MultiBoardRunner)
+    def handle_key(self, key):
+        if key == 'q':
+            self.is_running = False
+        elif key == 'r':  # Clear Mask
+            self.mask = None
+            self.roi = None
+        elif key == 'u':
+            self.lines_coords = self.lines_coords[:-1]
+            self.lines_version += 1
+            time.sleep(0.1)
+            # Save Lines
+            self.save_lines()
+        elif key == 's':
+            if not self.is_timing:
+                self.start_time = datetime.now()
+                self.is_timing = True
+                time.sleep(0.3)
+            else:
+                # Save Board Image for This Trial (Requested Before the Analyzer Sees the Trial Stop)
+                self.trial_snapshot_ticket = self.snapshot_service.request_snapshot()
+                self.start_time = 0
+                self.is_timing = False
+                time.sleep(0.3)
+        elif key == 'd':
+            delete_last_trial(self.data_folder)
+            time.sleep(0.3)
+        elif key == 'b':  # Board Must be Empty
+            self.background_frame = self.current_frame.copy()
+            self.background_service.update(self.background_frame)
+            self.background_service.request_snapshot()
+            self.background_version += 1
+            print(f"Empty Board Reference Saved to {self.background_location}")
+            time.sleep(0.3)
 
     def atoi(self, text):
         return int(text) if text.isdigit() else text
@@ -126,14 +188,8 @@ class WebCamFeed:
         return [ self.atoi(c) for c in re.split(r'(\d+)', text) ]
 
 
-    # Purpose: Make Left Click Bind to Crop Function
+    # Purpose: Make Left Click Bind to Crop Function (Called on the Display's GUI Thread Once the Window Exists)
     def prompt_crop(self):
-        # While the current frame isn't None -> Then wait an additional 0.3 seconds (make sure loaded)
-        while True:
-            if self.current_frame.all() is not None:
-                break
-        time.sleep(0.3)
-
         # Function linked to left click on frame (through cv2)
         def lc_callback(event, x, y, flags, param):
             # If Left MB Down
@@ -168,6 +224,7 @@ class WebCamFeed:
                 print(self.line_end)
                 # Update member variable Mask
                 self.lines_coords.append([self.line_start, self.line_end])
+                self.lines_version += 1
                 # Reset Line Start and End
                 self.line_start = (0, 0)
                 self.line_end = (0, 0)
@@ -179,22 +236,32 @@ class WebCamFeed:
         # Sets the webcam feed window's callback function when lc is pressed to lc_callback
         cv2.setMouseCallback(self.frame_title, lc_callback)
 
-    # Purpose: Update Member Variables for Crop and self.mask
+    # Purpose: Update Member Variables for Crop and self.mask (or self.roi in ROI Mode)
     def update_mask(self):
-        # Set the Mask Here
-        self.mask = np.zeros(self.current_frame.shape[:2], dtype="uint8")
         # Retrieve Start and End Crops
         (start_x, start_y) = self.crop_start
         (end_x, end_y) = self.crop_end
+        if self.roi_mode:
+            # Normalize Rectangle and Clip to Frame
+            frame_height, frame_width = self.current_frame.shape[:2]
+            x0, x1 = sorted((min(max(start_x, 0), frame_width), min(max(end_x, 0), frame_width)))
+            y0, y1 = sorted((min(max(start_y, 0), frame_height), min(max(end_y, 0), frame_height)))
+            # Empty Rectangle (Click Without Drag) Means No Crop
+            self.roi = (x0, y0, x1, y1) if x1 > x0 and y1 > y0 else None
+            return
+        # Set the Mask Here
+        self.mask = np.zeros(self.current_frame.shape[:2], dtype="uint8")
         # Get the mask rectangle using the start and end positions
         # (255=mask color, -1 = fill it in so it's a mask, not outline)
         cv2.rectangle(self.mask, (start_x, start_y), (end_x, end_y), 255, -1)
 
     def save_lines(self):
-        with open('cached_data/lines.pkl', 'wb') as f:
+        os.makedirs(self.cached_data_folder, exist_ok=True)
+        with open(self.lines_location, 'wb') as f:
             pickle.dump(self.lines_coords, f)
     
     def load_lines(self):
-        with open('cached_data/lines.pkl', 'rb') as f:
+        with open(self.lines_location, 'rb') as f:
             self.lines_coords = pickle.load(f)
+            self.lines_version += 1
             print(f'Lines Loaded: {self.lines_coords}')
\ No newline at end of file